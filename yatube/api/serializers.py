@@ -0,0 +1,46 @@
+"""Сериализация моделей posts в JSON через values().
+
+Вместо экземпляров моделей запросы отдают словари только с нужными
+полями, поэтому ORM не создает объекты и не тянет лишние колонки.
+"""
+from django.core.files.storage import default_storage
+
+POST_FIELDS = ('id', 'text', 'pub_date', 'image', 'thumbnail',
+               'author__username', 'group__slug')
+POST_DETAIL_FIELDS = POST_FIELDS + ('comment_count', 'updated_at')
+COMMENT_FIELDS = ('id', 'text', 'created', 'post_id', 'author__username')
+GROUP_FIELDS = ('id', 'title', 'slug', 'description')
+
+
+def media_url(name):
+    return default_storage.url(name) if name else None
+
+
+def post_json(row):
+    data = {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': media_url(row['image']),
+        'thumbnail': row['thumbnail'] or None,
+    }
+    for field in ('comment_count', 'updated_at'):
+        if field in row:
+            data[field] = row[field]
+    return data
+
+
+def comment_json(row):
+    return {
+        'id': row['id'],
+        'post': row['post_id'],
+        'author': row['author__username'],
+        'text': row['text'],
+        'created': row['created'],
+    }
+
+
+def group_json(row):
+    return {field: row[field] for field in GROUP_FIELDS}
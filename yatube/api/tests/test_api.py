@@ -0,0 +1,250 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def send(self, client, method, url, data):
+        return getattr(client, method)(url, json.dumps(data),
+                                       content_type='application/json')
+
+    def test_post_list(self):
+        """Лента постов отдается в JSON с курсором на следующую страницу
+        """
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'пост {i}') for i in range(12))
+        response = self.client.get(reverse('api:posts'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertIsNone(data['previous'])
+        self.assertEqual(set(data['results'][0]), {
+            'id', 'text', 'pub_date', 'author', 'group', 'image',
+            'thumbnail'})
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertIsNone(data['next'])
+        self.assertEqual(data['results'][-1]['id'], self.post.id)
+        self.assertEqual(data['results'][-1]['group'], 'test-slug')
+
+    def test_not_modified(self):
+        """Неизменная лента отвечает 304 без выборки постов
+        """
+        address = reverse('api:posts')
+        response = self.client.get(address)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Post.objects.create(author=self.author, text='новый пост')
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+    def test_post_detail_not_modified(self):
+        """ETag поста меняется вместе с числом комментариев
+        """
+        address = reverse('api:post', args=[self.post.id])
+        response = self.client.get(address)
+        self.assertEqual(response.json()['comment_count'], 0)
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get(address, HTTP_IF_NONE_MATCH=etag).status_code,
+            304)
+
+        Comment.objects.create(post=self.post, author=self.reader, text='1')
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comment_count'], 1)
+
+        # username автора и комментатора выводится в JSON
+        comments = reverse('api:comments', args=[self.post.id])
+        etags = {address: response['ETag'],
+                 comments: self.client.get(comments)['ETag']}
+        for user in (self.author, self.reader):
+            user = User.objects.get(pk=user.pk)
+            user.username += '_renamed'
+            user.save()
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etags[address])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['author'], 'author_renamed')
+        response = self.client.get(comments,
+                                   HTTP_IF_NONE_MATCH=etags[comments])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['author'],
+                         'reader_renamed')
+
+    def test_create_post(self):
+        """Авторизованный пользователь создает пост, аноним получает 401
+        """
+        address = reverse('api:posts')
+        data = {'text': 'Пост из API', 'group': 'test-slug'}
+        self.assertEqual(self.send(self.client, 'post', address,
+                                   data).status_code, 401)
+
+        response = self.send(self.author_client, 'post', address, data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['group'], 'test-slug')
+        self.assertTrue(Post.objects.filter(
+            text='Пост из API', group=self.group).exists())
+
+        response = self.send(self.author_client, 'post', address,
+                             {'text': 'пост', 'group': 'no-such-group'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('group', response.json()['errors'])
+
+    def test_edit_post(self):
+        """Менять и удалять пост может только автор
+        """
+        address = reverse('api:post', args=[self.post.id])
+        response = self.send(self.reader_client, 'patch', address,
+                             {'text': 'чужой текст'})
+        self.assertEqual(response.status_code, 403)
+
+        response = self.send(self.author_client, 'patch', address,
+                             {'text': 'новый текст'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['text'], 'новый текст')
+        self.assertEqual(response.json()['group'], 'test-slug')
+
+        self.assertEqual(
+            self.author_client.delete(address).status_code, 204)
+        response = self.client.get(address)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['detail'], 'Не найдено')
+
+    def test_edit_post_multipart(self):
+        """PATCH в multipart/form-data меняет текст и картинку поста
+        """
+        media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, media_root, True)
+        gif = (b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00'
+               b'\x00\x21\xf9\x04\x01\x0a\x00\x01\x00\x2c\x00\x00'
+               b'\x00\x00\x01\x00\x01\x00\x00\x02\x02\x4c\x01\x00'
+               b'\x3b')
+        body = encode_multipart(BOUNDARY, {
+            'text': 'текст с картинкой',
+            'image': SimpleUploadedFile('small.gif', gif, 'image/gif'),
+        })
+        with override_settings(MEDIA_ROOT=media_root):
+            response = self.author_client.patch(
+                reverse('api:post', args=[self.post.id]), body,
+                content_type=MULTIPART_CONTENT)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['text'], 'текст с картинкой')
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.image.name.endswith('.gif'))
+
+    def test_csrf(self):
+        """Без токена CSRF изменяющий запрос получает 403 в JSON,
+        с токеном из api:csrf проходит
+        """
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        address = reverse('api:posts')
+        response = self.send(client, 'post', address, {'text': 'пост'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('CSRF', response.json()['detail'])
+
+        token = client.get(reverse('api:csrf')).json()['csrf_token']
+        response = client.post(address, json.dumps({'text': 'пост'}),
+                               content_type='application/json',
+                               HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 201)
+
+    def test_comments(self):
+        """Комментарии создаются и читаются через API
+        """
+        address = reverse('api:comments', args=[self.post.id])
+        response = self.send(self.reader_client, 'post', address,
+                             {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 201)
+        data = self.client.get(address).json()
+        self.assertEqual(data['results'][0]['text'], 'Комментарий')
+        self.assertEqual(data['results'][0]['author'], 'reader')
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1000)
+    def test_follow(self):
+        """Подписка через API добавляет посты автора в ленту
+        """
+        address = reverse('api:follow')
+        self.assertEqual(self.client.get(address).status_code, 401)
+
+        response = self.send(self.reader_client, 'post', address,
+                             {'author': 'author'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+        response = self.reader_client.get(address)
+        self.assertEqual(response.json()['results'][0]['id'], self.post.id)
+        etag = response['ETag']
+
+        response = self.reader_client.delete(
+            reverse('api:unfollow', args=['author']))
+        self.assertEqual(response.status_code, 204)
+        response = self.reader_client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_groups(self):
+        """Группы и посты группы отдаются в JSON
+        """
+        data = self.client.get(reverse('api:groups')).json()
+        self.assertEqual(data['results'][0]['slug'], 'test-slug')
+        data = self.client.get(
+            reverse('api:group_posts', args=['test-slug'])).json()
+        self.assertEqual(data['results'][0]['id'], self.post.id)
+        data = self.client.get(
+            reverse('api:user_posts', args=['author'])).json()
+        self.assertEqual(data['results'][0]['id'], self.post.id)
+
+    def test_changes(self):
+        """Журнал изменений читается порциями по курсору since
+        """
+        address = reverse('api:changes')
+        data = self.client.get(address).json()
+        self.assertEqual(data['results'][-1]['object_id'], self.post.id)
+        self.send(self.author_client, 'patch',
+                  reverse('api:post', args=[self.post.id]),
+                  {'text': 'правка'})
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual(
+            [(row['model'], row['action']) for row in data['results']],
+            [('post', 'update')])
+        self.assertEqual(self.client.get(data['next']).json()['results'],
+                         [])
+        self.assertEqual(
+            self.client.get(address, {'since': 'x'}).status_code, 400)
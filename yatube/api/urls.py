@@ -0,0 +1,21 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('v1/posts/', views.posts, name='posts'),
+    path('v1/posts/<int:post_id>/', views.post, name='post'),
+    path('v1/posts/<int:post_id>/comments/',
+         views.comments, name='comments'),
+    path('v1/groups/', views.groups, name='groups'),
+    path('v1/groups/<slug:slug>/posts/',
+         views.group_posts, name='group_posts'),
+    path('v1/users/<str:username>/posts/',
+         views.user_posts, name='user_posts'),
+    path('v1/follow/', views.follow, name='follow'),
+    path('v1/follow/<str:username>/', views.unfollow, name='unfollow'),
+    path('v1/changes/', views.change_log, name='changes'),
+    path('v1/csrf/', views.csrf, name='csrf'),
+]
@@ -0,0 +1,340 @@
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict
+from django.http.multipartparser import MultiPartParserError
+from django.middleware.csrf import get_token
+from django.shortcuts import get_object_or_404
+from django.utils.http import urlencode
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from posts import changes, tasks
+from posts.cache import cards_version, feed_generation, feed_last_modified
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+from posts.timeline import TimelinePage, popular_authors_for
+from posts.utils import CursorPage
+
+from .serializers import (COMMENT_FIELDS, GROUP_FIELDS, POST_DETAIL_FIELDS,
+                          POST_FIELDS, comment_json, group_json, post_json)
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def error(status, detail, **extra):
+    return json_response({'detail': detail, **extra}, status=status)
+
+
+def api_view(*methods, login_required=()):
+    """Разбирает метод запроса и отдает ошибки в JSON.
+    Методы из login_required доступны только авторизованным.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = error(405, 'Метод не поддерживается')
+                response['Allow'] = ', '.join(methods)
+                return response
+            if (request.method in login_required
+                    and not request.user.is_authenticated):
+                return error(401, 'Требуется авторизация')
+            try:
+                return view(request, *args, **kwargs)
+            except Http404:
+                return error(404, 'Не найдено')
+        return wrapper
+    return decorator
+
+
+def request_data(request):
+    """Данные запроса из JSON или из формы (для загрузки картинок).
+    Django разбирает форму только у POST, поэтому тело PATCH в
+    multipart/form-data разбирается здесь; файлы попадают в request.FILES.
+    """
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            raise ValueError('Ожидается JSON-объект')
+        return data
+    if request.method == 'POST':
+        return request.POST.dict()
+    if request.content_type == 'multipart/form-data':
+        try:
+            data, request._files = request.parse_file_upload(
+                request.META, request)
+        except MultiPartParserError as exc:
+            raise ValueError('Ошибка в теле запроса') from exc
+        return data.dict()
+    return QueryDict(request.body, encoding=request.encoding).dict()
+
+
+def page_response(request, queryset, serialize, fields=('pub_date', 'id')):
+    return page_json(request, CursorPage(
+        queryset, settings.OUTPUT_LIMIT, request.GET.get('cursor'),
+        fields=fields), serialize)
+
+
+def page_json(request, page, serialize):
+    def link(cursor):
+        if cursor is None:
+            return None
+        return f'{request.path}?{urlencode({"cursor": cursor})}'
+
+    return json_response({
+        'results': [serialize(row) for row in page],
+        'next': link(page.next_cursor),
+        'previous': link(page.previous_cursor),
+    })
+
+
+def feed_etag(request, *args, **kwargs):
+    return f'feed-{feed_generation()}'
+
+
+def feed_modified(request, *args, **kwargs):
+    return feed_last_modified()
+
+
+def feed_condition(view):
+    return condition(etag_func=feed_etag, last_modified_func=feed_modified)(
+        view)
+
+
+def post_etag(request, post_id):
+    state = Post.objects.filter(pk=post_id).values_list(
+        'updated_at', 'comment_count').first()
+    if state is None:
+        return None
+    updated_at, comment_count = state
+    # username автора и slug группы меняются без правки поста: их
+    # правки поднимают версию карточек
+    return (f'post-{post_id}-{updated_at.timestamp()}-{comment_count}-'
+            f'{cards_version()}')
+
+
+def comments_etag(request, post_id):
+    stats = Comment.objects.filter(post_id=post_id).aggregate(
+        total=Count('id'), last=Max('id'))
+    return (f'comments-{post_id}-{stats["total"]}-{stats["last"]}-'
+            f'{cards_version()}')
+
+
+def follow_etag(request):
+    user = request.user
+    stats = TimelineEntry.objects.filter(user=user).aggregate(
+        total=Count('id'), last=Max('id'))
+    pulled = '.'.join(str(pk) for pk in sorted(popular_authors_for(user)))
+    return (f'follow-{user.pk}-{feed_generation()}-'
+            f'{stats["total"]}-{stats["last"]}-{pulled}')
+
+
+def post_form(request, instance=None):
+    """PostForm по данным API: группа передается slug-ом."""
+    data = request_data(request)
+    if instance is not None:
+        data = {'text': instance.text,
+                'group': instance.group.slug if instance.group else None,
+                **data}
+    slug = data.get('group')
+    if slug:
+        group = Group.objects.filter(slug=slug).values_list('pk', flat=True)
+        data['group'] = group.first() or -1
+    return PostForm(data, files=request.FILES or None, instance=instance)
+
+
+def saved_post(post_id, status=200):
+    row = Post.objects.values(*POST_DETAIL_FIELDS).get(pk=post_id)
+    return json_response(post_json(row), status=status)
+
+
+@feed_condition
+def _post_list(request):
+    return page_response(request, Post.objects.for_feed().values(
+        *POST_FIELDS), post_json)
+
+
+def _post_create(request):
+    try:
+        form = post_form(request)
+    except ValueError as exc:
+        return error(400, str(exc))
+    if not form.is_valid():
+        return error(400, 'Ошибка в данных', errors=form.errors)
+    post = form.save(commit=False)
+    post.author = request.user
+    post.save()
+    tasks.queue_images(post)
+    return saved_post(post.pk, status=201)
+
+
+@api_view('GET', 'HEAD', 'POST', login_required=('POST',))
+def posts(request):
+    if request.method == 'POST':
+        return _post_create(request)
+    return _post_list(request)
+
+
+@condition(etag_func=post_etag)
+def _post_detail(request, post_id):
+    row = get_object_or_404(Post.objects.values(*POST_DETAIL_FIELDS),
+                            pk=post_id)
+    return json_response(post_json(row))
+
+
+def _post_change(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    if post.author_id != request.user.pk:
+        return error(403, 'Изменять пост может только автор')
+    if request.method == 'DELETE':
+        post.delete()
+        return HttpResponse(status=204)
+    try:
+        form = post_form(request, instance=post)
+    except ValueError as exc:
+        return error(400, str(exc))
+    if not form.is_valid():
+        return error(400, 'Ошибка в данных', errors=form.errors)
+    post = form.save(commit=False)
+    if 'image' in form.changed_data:
+        post.thumbnail = ''
+    post.save()
+    tasks.queue_images(post)
+    return saved_post(post.pk)
+
+
+@api_view('GET', 'HEAD', 'PATCH', 'DELETE',
+          login_required=('PATCH', 'DELETE'))
+def post(request, post_id):
+    if request.method in ('PATCH', 'DELETE'):
+        return _post_change(request, post_id)
+    return _post_detail(request, post_id)
+
+
+@condition(etag_func=comments_etag)
+def _comment_list(request, post_id):
+    get_object_or_404(Post.objects.only('id'), pk=post_id)
+    return page_response(
+        request,
+        Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+        comment_json,
+        fields=('created', 'id'))
+
+
+def _comment_create(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    try:
+        form = CommentForm(request_data(request))
+    except ValueError as exc:
+        return error(400, str(exc))
+    if not form.is_valid():
+        return error(400, 'Ошибка в данных', errors=form.errors)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    comment.save()
+    row = Comment.objects.values(*COMMENT_FIELDS).get(pk=comment.pk)
+    return json_response(comment_json(row), status=201)
+
+
+@api_view('GET', 'HEAD', 'POST', login_required=('POST',))
+def comments(request, post_id):
+    if request.method == 'POST':
+        return _comment_create(request, post_id)
+    return _comment_list(request, post_id)
+
+
+@api_view('GET', 'HEAD')
+@feed_condition
+def groups(request):
+    return json_response({
+        'results': [group_json(row) for row in
+                    Group.objects.order_by('title').values(*GROUP_FIELDS)],
+    })
+
+
+@api_view('GET', 'HEAD')
+@feed_condition
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('id'), slug=slug)
+    return page_response(request, Post.objects.for_feed().filter(
+        group=group).values(*POST_FIELDS), post_json)
+
+
+@api_view('GET', 'HEAD')
+@feed_condition
+def user_posts(request, username):
+    author = get_object_or_404(User.objects.only('id'), username=username)
+    return page_response(request, Post.objects.for_feed().filter(
+        author=author).values(*POST_FIELDS), post_json)
+
+
+@vary_on_cookie
+@condition(etag_func=follow_etag)
+def _follow_feed(request):
+    return page_json(request, TimelinePage(
+        request.user, settings.OUTPUT_LIMIT, request.GET.get('cursor'),
+        Post.objects.for_feed().values(*POST_FIELDS)), post_json)
+
+
+def _follow_create(request):
+    try:
+        username = request_data(request).get('author')
+    except ValueError as exc:
+        return error(400, str(exc))
+    author = get_object_or_404(User.objects.only('id'), username=username)
+    if author.pk == request.user.pk:
+        return error(400, 'Нельзя подписаться на себя')
+    _, created = Follow.objects.get_or_create(user=request.user,
+                                              author=author)
+    return json_response({'author': username},
+                         status=201 if created else 200)
+
+
+@api_view('GET', 'HEAD', 'POST', login_required=('GET', 'HEAD', 'POST'))
+def follow(request):
+    if request.method == 'POST':
+        return _follow_create(request)
+    return _follow_feed(request)
+
+
+@api_view('DELETE', login_required=('DELETE',))
+def unfollow(request, username):
+    get_object_or_404(Follow, user=request.user,
+                      author__username=username).delete()
+    return HttpResponse(status=204)
+
+
+@api_view('GET', 'HEAD')
+def change_log(request):
+    try:
+        since = changes.parse_since(request.GET.get('since'))
+    except ValueError:
+        return error(400, 'Неверный курсор since')
+    model = request.GET.get('model')
+    if model is not None and model not in changes.MODEL_NAMES.values():
+        return error(400, 'Неизвестная модель')
+    rows, cursor = changes.changes_since(since, model)
+    query = {'since': cursor, **({'model': model} if model else {})}
+    return json_response({
+        'results': rows,
+        'next': f'{request.path}?{urlencode(query)}',
+    })
+
+
+@api_view('GET', 'HEAD')
+@ensure_csrf_cookie
+def csrf(request):
+    """Токен для заголовка X-CSRFToken изменяющих запросов API;
+    заодно ставится cookie csrftoken."""
+    return json_response({'csrf_token': get_token(request)})
@@ -0,0 +1,334 @@
+"""Бэкенды кеша и защита от одновременного пересчета.
+
+LocMemCache живет внутри процесса: у каждого воркера gunicorn свой
+холодный кеш, и сброс поколения лент виден только тому воркеру, где он
+случился. RespCache хранит данные на общем сервере с протоколом Redis
+(core.resp), а пока сервер недоступен — в FileBasedCache на диске,
+общем для воркеров одной машины. Ключи, измененные без сервера,
+запоминаются и при восстановлении связи правятся и на сервере: там
+остались значения до сбоя, и без этого вернулись бы, например, старое
+поколение лент и собранные для него фрагменты.
+
+get_or_compute не дает истекшему ключу отправить в базу все воркеры
+сразу: значение пересчитывается заранее с вероятностью, растущей к
+концу срока (XFetch), а пересчитывает его только тот, кто взял
+блокировку через cache.add.
+"""
+import logging
+import math
+import pickle
+import random
+import time
+from functools import wraps
+
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .metrics import active
+from .resp import RespClient
+
+logger = logging.getLogger('yatube.cache')
+
+MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """Учитывает попадания и промахи кеша в core.metrics."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version=version)
+        for metrics in active():
+            if value is MISSING:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is MISSING else value
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+def _dumps(value):
+    # Целые числа хранятся как есть, чтобы работал атомарный INCRBY.
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value).encode()
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(data):
+    if data[:1] == b'\x80':
+        return pickle.loads(data)
+    return int(data)
+
+
+# больше измененных без сервера ключей не запоминается: при
+# восстановлении связи сервер очищается целиком
+PENDING_LIMIT = 10000
+
+
+def _call_arguments(name, args, kwargs):
+    """Аргументы вызова метода кеша name по именам."""
+    names = {'set_many': ('data',), 'delete_many': ('keys',),
+             'incr': ('key', 'delta')}.get(name, ('key',))
+    return {**dict(zip(names, args)), **kwargs}
+
+
+def fallback(method):
+    """При недоступном сервере выполняет тот же метод на запасном
+    FileBasedCache и не трогает сервер RETRY_SECONDS секунд.
+    Изменения, сделанные без сервера, переносятся на сервер при
+    первом обращении после сбоя (RespCache.resync).
+    """
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if time.monotonic() >= self._down_until:
+            try:
+                if self._pending or self._flush:
+                    self.resync()
+                return method(self, *args, **kwargs)
+            except OSError as error:
+                self._down_until = time.monotonic() + self._retry_seconds
+                logger.warning('Сервер кеша %s недоступен (%s), '
+                               'используется %s', self._location, error,
+                               self._fallback._dir)
+        if name in self.WRITES:
+            self._remember(name, args, kwargs)
+        return getattr(self._fallback, name)(*args, **kwargs)
+    return wrapper
+
+
+class RespCache(BaseCache):
+    """Кеш на сервере с протоколом Redis.
+
+    CACHES = {'default': {
+        'BACKEND': 'core.cache.InstrumentedRespCache',
+        'LOCATION': 'redis://localhost:6379/0',
+        'OPTIONS': {'SOCKET_TIMEOUT': 0.5,
+                    'FALLBACK_LOCATION': '/var/tmp/yatube_cache',
+                    'RETRY_SECONDS': 5},
+    }}
+    """
+    WRITES = ('add', 'set', 'touch', 'delete', 'set_many', 'delete_many',
+              'incr', 'clear')
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS', {}))
+        timeout = options.pop('SOCKET_TIMEOUT', 0.5)
+        fallback_location = options.pop('FALLBACK_LOCATION')
+        self._retry_seconds = options.pop('RETRY_SECONDS', 5)
+        super().__init__({**params, 'OPTIONS': options})
+        self._location = location
+        self._client = RespClient.from_url(location, timeout=timeout)
+        self._fallback = FileBasedCache(
+            fallback_location, {**params, 'OPTIONS': options})
+        self._down_until = 0.0
+        # ключ сервера -> на сколько его увеличили (incr) или None, если
+        # значение на сервере надо просто удалить
+        self._pending = {}
+        self._flush = False
+
+    def _remember(self, name, args, kwargs):
+        if name == 'clear':
+            self._pending = {}
+            self._flush = True
+            return
+        call = _call_arguments(name, args, kwargs)
+        version = call.get('version')
+        if name == 'incr':
+            key = self.make_key(call['key'], version=version)
+            delta = call.get('delta', 1)
+            self._pending[key] = (self._pending.get(key) or 0) + delta
+        else:
+            keys = call.get('data', call.get('keys', [call.get('key')]))
+            for key in keys:
+                key = self.make_key(key, version=version)
+                # увеличенный счетчик должен увеличиться и на сервере
+                if not isinstance(self._pending.get(key), int):
+                    self._pending[key] = None
+        if len(self._pending) > PENDING_LIMIT:
+            self._pending = {}
+            self._flush = True
+
+    def resync(self):
+        """Переносит на сервер изменения, сделанные без него: удаляет
+        перезаписанные ключи, увеличивает счетчики (поколения и версии)
+        на сумму пропущенных incr. Запасной кеш очищается, чтобы при
+        следующем сбое не ожили его старые значения.
+        """
+        if self._flush:
+            self._client.execute('FLUSHDB')
+        else:
+            deleted = [key for key, delta in self._pending.items()
+                       if delta is None]
+            if deleted:
+                self._client.execute('DEL', *deleted)
+            for key, delta in self._pending.items():
+                if delta is not None and self._client.execute('EXISTS', key):
+                    self._client.execute('INCRBY', key, delta)
+        self._pending = {}
+        self._flush = False
+        self._fallback.clear()
+        logger.info('Связь с сервером кеша %s восстановлена', self._location)
+
+    def _expiry(self, timeout):
+        """Аргументы срока жизни для SET или None, если значение
+        уже истекло."""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return ()
+        milliseconds = int(timeout * 1000)
+        if milliseconds <= 0:
+            return None
+        return ('PX', milliseconds)
+
+    @fallback
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expiry = self._expiry(timeout)
+        if expiry is None:
+            return False
+        return self._client.execute(
+            'SET', key, _dumps(value), *expiry, 'NX') is not None
+
+    @fallback
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        data = self._client.execute('GET', key)
+        return default if data is None else _loads(data)
+
+    @fallback
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expiry = self._expiry(timeout)
+        if expiry is None:
+            self._client.execute('DEL', key)
+        else:
+            self._client.execute('SET', key, _dumps(value), *expiry)
+
+    @fallback
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expiry = self._expiry(timeout)
+        if expiry is None:
+            return bool(self._client.execute('DEL', key))
+        if not expiry:
+            return bool(self._client.execute('EXISTS', key))
+        return bool(self._client.execute('PEXPIRE', key, expiry[1]))
+
+    @fallback
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._client.execute('DEL', key)
+
+    @fallback
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        made = [self.make_key(key, version=version) for key in keys]
+        for key in made:
+            self.validate_key(key)
+        values = self._client.execute('MGET', *made)
+        return {key: _loads(data) for key, data in zip(keys, values)
+                if data is not None}
+
+    @fallback
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expiry = self._expiry(timeout)
+        commands = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            if expiry is None:
+                commands.append(('DEL', key))
+            else:
+                commands.append(('SET', key, _dumps(value), *expiry))
+        self._client.pipeline(commands)
+        return []
+
+    @fallback
+    def delete_many(self, keys, version=None):
+        made = [self.make_key(key, version=version) for key in keys]
+        if made:
+            self._client.execute('DEL', *made)
+
+    @fallback
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return bool(self._client.execute('EXISTS', key))
+
+    @fallback
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        if not self._client.execute('EXISTS', key):
+            raise ValueError(f"Key '{key}' not found")
+        return self._client.execute('INCRBY', key, delta)
+
+    @fallback
+    def clear(self):
+        self._client.execute('FLUSHDB')
+
+    def close(self, **kwargs):
+        # Django закрывает кеши после каждого запроса; соединение потока
+        # переиспользуется, как постоянное соединение с базой.
+        pass
+
+
+class InstrumentedRespCache(InstrumentedCacheMixin, RespCache):
+    pass
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def get_or_compute(key, compute, timeout, cache=None, beta=1.0,
+                   lock_timeout=10, wait=0.05):
+    """Значение ключа или результат compute() без лавины пересчетов.
+
+    В кеше лежит (значение, время пересчета, срок). Чем ближе срок и
+    чем дольше пересчет, тем вероятнее, что очередной читатель
+    пересчитает значение заранее (XFetch, beta регулирует охотность).
+    Пересчитывает только взявший блокировку: остальные до истечения
+    отдают старое значение, а если значения нет, ждут его не дольше
+    lock_timeout секунд.
+    """
+    cache = cache or default_cache
+    deadline = time.monotonic() + lock_timeout
+    while True:
+        entry = cache.get(key)
+        now = time.time()
+        if entry is not None:
+            _, delta, expires = entry
+            early = delta * beta * -math.log(1.0 - random.random())
+            if expires is None or now + early < expires:
+                return entry[0]
+        if cache.add(_lock_key(key), 1, lock_timeout):
+            break
+        if entry is not None:
+            return entry[0]
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(wait)
+    try:
+        start = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - start
+        expires = None if timeout is None else time.time() + timeout
+        cache.set(key, (value, delta, expires), timeout)
+    finally:
+        cache.delete(_lock_key(key))
+    return value
@@ -0,0 +1,127 @@
+"""Маршрутизация запросов между основной базой и репликами.
+
+Чтение моделей из REPLICA_APPS уходит на случайную реплику из
+DATABASE_REPLICAS, запись — всегда в default. Чтобы автор сразу видел
+свои изменения, поток после записи закрепляется за основной базой,
+а ReplicaPinMiddleware продлевает закрепление на следующие запросы
+пользователя через cookie на REPLICA_PIN_SECONDS.
+
+Там же настраивается SQLite при открытии соединения: WAL, чтобы
+чтение не ждало записи, и прагмы из SQLITE_PRAGMAS.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY = 'default'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def is_pinned():
+    return (getattr(_state, 'depth', 0) > 0
+            or getattr(_state, 'pinned', False)
+            or wrote())
+
+
+def wrote():
+    """Была ли запись в этом потоке с последнего reset()."""
+    return getattr(_state, 'wrote', False)
+
+
+def pin():
+    """Закрепляет поток за основной базой до reset()."""
+    _state.pinned = True
+
+
+def reset():
+    _state.pinned = False
+    _state.wrote = False
+
+
+@contextmanager
+def use_primary():
+    """Все чтения внутри блока идут в основную базу."""
+    _state.depth = getattr(_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or is_pinned():
+            return PRIMARY
+        if model._meta.app_label not in getattr(settings, 'REPLICA_APPS', ()):
+            return PRIMARY
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # реплики получают схему вместе с данными от основной базы
+        return db not in replicas()
+
+
+class ReplicaPinMiddleware:
+    """Закрепляет запросы пользователя за основной базой на
+    REPLICA_PIN_SECONDS после записи, чтобы реплика с отставанием
+    не показала ему старые данные.
+    """
+    cookie_name = 'primary_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset()
+        if not replicas():
+            return self.get_response(request)
+        try:
+            pinned_until = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            pinned_until = 0
+        if pinned_until > time.time() or request.method not in SAFE_METHODS:
+            pin()
+        try:
+            response = self.get_response(request)
+            if wrote():
+                seconds = pin_seconds()
+                response.set_cookie(self.cookie_name,
+                                    str(time.time() + seconds),
+                                    max_age=seconds, httponly=True,
+                                    samesite='Lax')
+        finally:
+            reset()
+        return response
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Обработчик connection_created: WAL и прагмы для SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
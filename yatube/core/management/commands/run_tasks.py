@@ -0,0 +1,46 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.tasks import run_pending, worker_name
+
+
+class Command(BaseCommand):
+    help = ('Воркер очереди задач core.tasks: выполняет задачи из '
+            'таблицы core_task. Воркеров можно запустить несколько.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='выполнить накопившиеся задачи и выйти')
+        parser.add_argument('--interval', type=float,
+                            default=settings.TASK_POLL_INTERVAL,
+                            help='пауза между опросами пустой очереди, с')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='выйти после стольких задач')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        worker = worker_name()
+        limit = options['limit']
+        done = 0
+        self.stdout.write(f'Воркер {worker} запущен')
+        while not self.stopping and (limit is None or done < limit):
+            close_old_connections()
+            # по одной задаче за проход, чтобы сигнал остановки
+            # срабатывал между задачами
+            processed = run_pending(worker, limit=1)
+            done += processed
+            if not processed:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        close_old_connections()
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {done}'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
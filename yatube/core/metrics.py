@@ -0,0 +1,96 @@
+"""Сбор метрик производительности для запроса или участка кода.
+
+    with collect() as metrics:
+        ...
+    metrics.queries, metrics.sql_time, metrics.render_time
+
+SQL считается через connection.execute_wrapper, время рендера шаблонов
+отдает бэкенд core.template_backends.InstrumentedDjangoTemplates.
+"""
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+_local = threading.local()
+
+
+class Metrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.wall_time = 0.0
+        self.started = time.perf_counter()
+        self.render_depth = 0
+
+    def as_dict(self):
+        """Метрики в миллисекундах для логов и отчетов."""
+        return {
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 3),
+            'render_ms': round(self.render_time * 1000, 3),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'total_ms': round(self.wall_time * 1000, 3),
+        }
+
+
+class SQLTimer:
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.metrics.queries += 1
+            self.metrics.sql_time += time.perf_counter() - start
+
+
+def active():
+    """Все метрики, которые собираются сейчас в этом потоке.
+    Сборы бывают вложенными (бенчмарк снаружи, middleware внутри),
+    и каждый из них должен увидеть рендер и обращения к кешу.
+    """
+    return list(getattr(_local, 'stack', ()))
+
+
+@contextmanager
+def timed_render():
+    """Учитывает время рендера; вложенные шаблоны не считаются дважды."""
+    collectors = active()
+    if not collectors:
+        yield
+        return
+    for metrics in collectors:
+        metrics.render_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        for metrics in collectors:
+            metrics.render_depth -= 1
+            if not metrics.render_depth:
+                metrics.render_time += elapsed
+
+
+@contextmanager
+def collect():
+    metrics = Metrics()
+    stack = _local.__dict__.setdefault('stack', [])
+    stack.append(metrics)
+    try:
+        with ExitStack() as wrappers:
+            for connection in connections.all():
+                wrappers.enter_context(
+                    connection.execute_wrapper(SQLTimer(metrics)))
+            yield metrics
+    finally:
+        metrics.wall_time = time.perf_counter() - metrics.started
+        stack.pop()
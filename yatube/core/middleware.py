@@ -0,0 +1,50 @@
+import json
+import logging
+
+from django.conf import settings
+
+from .metrics import collect
+
+slow_logger = logging.getLogger('yatube.slow_requests')
+
+
+class PerformanceMiddleware:
+    """Метрики каждого запроса: имя view, число и время SQL-запросов,
+    время рендера, попадания в кеш и общее время.
+
+    Метрики отдаются в заголовке Server-Timing, а запросы дольше
+    SLOW_REQUEST_THRESHOLD_MS пишутся JSON-строкой в лог
+    yatube.slow_requests.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect() as metrics:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else ''
+        data = metrics.as_dict()
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing(data)
+        threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500)
+        if data['total_ms'] >= threshold:
+            slow_logger.warning(json.dumps({
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **data,
+            }, ensure_ascii=False))
+        return response
+
+
+def server_timing(data):
+    return ', '.join((
+        f'sql;dur={data["sql_ms"]};desc="{data["queries"]} queries"',
+        f'render;dur={data["render_ms"]}',
+        f'cache;desc="{data["cache_hits"]} hits, '
+        f'{data["cache_misses"]} misses"',
+        f'total;dur={data["total_ms"]}',
+    ))
@@ -0,0 +1,46 @@
+from django.db import models
+
+
+class Task(models.Model):
+    """Отложенная задача очереди core.tasks.
+    Выполненные задачи удаляются, упавшие после всех попыток остаются
+    со статусом failed и текстом ошибки.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=200, verbose_name='Задача')
+    args = models.TextField(default='[]', verbose_name='Аргументы (JSON)')
+    status = models.CharField(max_length=10,
+                              choices=STATUSES,
+                              default=QUEUED,
+                              verbose_name='Статус',
+                              )
+    attempts = models.PositiveSmallIntegerField(default=0,
+                                                verbose_name='Попыток')
+    run_at = models.DateTimeField(verbose_name='Выполнить после')
+    locked_by = models.CharField(max_length=100, blank=True,
+                                 verbose_name='Воркер')
+    locked_at = models.DateTimeField(null=True, blank=True,
+                                     verbose_name='Взята в работу')
+    last_error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Создана')
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_at', 'id'],
+                         name='task_status_run_at_idx'),
+        ]
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
@@ -0,0 +1,134 @@
+"""Минимальный клиент протокола RESP (Redis и совместимые серверы).
+
+Хватает того, что нужно кешу: отправка команды и разбор ответа,
+конвейер из нескольких команд за один обмен и по одному соединению
+на поток. Сторонних зависимостей нет.
+
+    client = RespClient.from_url('redis://localhost:6379/0')
+    client.execute('SET', 'key', b'value', 'PX', 1000)
+    client.pipeline([('GET', 'a'), ('GET', 'b')])
+"""
+import socket
+import threading
+from urllib.parse import urlparse
+
+DEFAULT_PORT = 6379
+
+
+class RespError(Exception):
+    """Сервер ответил ошибкой (-ERR ...)."""
+
+
+def encode_command(args):
+    """Команда в виде массива bulk-строк."""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+class Connection:
+    def __init__(self, host, port, db=0, password=None, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile('rb')
+        if password:
+            self.request([('AUTH', password)])
+        if db:
+            self.request([('SELECT', db)])
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def read_reply(self):
+        line = self.file.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('Соединение с сервером кеша закрыто')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            return RespError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.file.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError('Соединение с сервером кеша закрыто')
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self.read_reply() for _ in range(length)]
+        raise ConnectionError(f'Непонятный ответ сервера кеша: {line!r}')
+
+    def request(self, commands):
+        """Отправляет команды одним пакетом и читает все ответы.
+        Ошибка любой команды поднимается после чтения всех ответов,
+        чтобы соединение осталось синхронным.
+        """
+        self.sock.sendall(b''.join(encode_command(c) for c in commands))
+        replies = [self.read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+
+class RespClient:
+    """Клиент с отдельным соединением на каждый поток.
+    Соединение, на котором случилась сетевая ошибка, закрывается, и
+    следующая команда откроет новое.
+    """
+
+    def __init__(self, host='localhost', port=DEFAULT_PORT, db=0,
+                 password=None, timeout=None):
+        self.address = (host, port)
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url, timeout=None):
+        """redis://[:password@]host[:port][/db]"""
+        parsed = urlparse(url)
+        db = parsed.path.strip('/')
+        return cls(host=parsed.hostname or 'localhost',
+                   port=parsed.port or DEFAULT_PORT,
+                   db=int(db) if db else 0,
+                   password=parsed.password, timeout=timeout)
+
+    def connection(self):
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = Connection(
+                *self.address, db=self.db, password=self.password,
+                timeout=self.timeout)
+        return self._local.connection
+
+    def disconnect(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            self._local.connection = None
+            conn.close()
+
+    def pipeline(self, commands):
+        if not commands:
+            return []
+        try:
+            return self.connection().request(commands)
+        except OSError:
+            self.disconnect()
+            raise
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
@@ -0,0 +1,166 @@
+"""Сборка и раздача статики.
+
+collectstatic через CompressedManifestStaticFilesStorage кладет в
+STATIC_ROOT файлы с хешем содержимого в имени (css/bootstrap.3f2a1c.css)
+и рядом сжатые копии .gz и, если установлен пакет brotli, .br.
+Шаблоны получают адрес с хешем из манифеста staticfiles.json; пока
+collectstatic не запускался (разработка, тесты), адрес остается
+исходным.
+
+StaticFilesMiddleware отдает файлы из STATIC_ROOT раньше остальных
+middleware: сжатую копию по Accept-Encoding и для файлов с хешем
+Cache-Control на год с immutable — при изменении файла изменится и имя.
+"""
+import gzip
+import json
+import logging
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.ico', '.json', '.txt',
+                       '.map', '.xml', '.html')
+# Маленькие файлы сжатие почти не уменьшает.
+COMPRESS_MIN_SIZE = 256
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CACHE_CONTROL = 'public, max-age=60'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress_file(path):
+    """Пишет рядом с файлом .gz (и .br); возвращает новые пути."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return []
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) >= len(data):
+            continue
+        with open(path + suffix, 'wb') as file:
+            file.write(compressed)
+        written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def stored_name(self, name):
+        # Без манифеста (collectstatic не запускался) или для файла,
+        # добавленного после сборки, отдаем исходное имя вместо ошибки.
+        if not self.hashed_files:
+            return name
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            logger.warning('Нет записи в манифесте статики для %s', name)
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for hashed_name in self.hashed_files.values():
+            if not hashed_name.endswith(COMPRESS_EXTENSIONS):
+                continue
+            for path in compress_file(self.path(hashed_name)):
+                yield hashed_name, os.path.relpath(path, self.location), True
+
+
+class StaticFile:
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.immutable = immutable
+        self.content_type = (mimetypes.guess_type(path)[0]
+                             or 'application/octet-stream')
+        self.etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+        self.encoded = {encoding: path + suffix
+                        for encoding, suffix in ENCODINGS
+                        if os.path.exists(path + suffix)}
+
+    def choose(self, accept_encoding):
+        """(путь, кодировка) под заголовок Accept-Encoding клиента."""
+        accepted = {part.split(';')[0].strip()
+                    for part in accept_encoding.split(',')}
+        for encoding, _ in ENCODINGS:
+            if encoding in accepted and encoding in self.encoded:
+                return self.encoded[encoding], encoding
+        return self.path, None
+
+
+def scan(root):
+    """Файлы STATIC_ROOT по относительному пути в URL."""
+    files = {}
+    if not root or not os.path.isdir(root):
+        return files
+    try:
+        with open(os.path.join(root, 'staticfiles.json')) as manifest:
+            hashed = set(json.load(manifest)['paths'].values())
+    except (OSError, ValueError, KeyError):
+        hashed = set()
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+                continue
+            path = os.path.join(directory, name)
+            url = os.path.relpath(path, root).replace(os.sep, '/')
+            files[url] = StaticFile(path, url in hashed)
+    return files
+
+
+class StaticFilesMiddleware:
+    """Раздает собранную статику, не доходя до view и остальных
+    middleware. Список файлов читается один раз при запуске:
+    после collectstatic воркеры нужно перезапустить.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.files = scan(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(
+                self.prefix):
+            static_file = self.files.get(request.path[len(self.prefix):])
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def serve(self, request, static_file):
+        path, encoding = static_file.choose(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = static_file.etag
+        if encoding:
+            etag = f'{etag[:-1]}-{encoding}"'
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=static_file.content_type)
+            response['Content-Length'] = os.path.getsize(path)
+        else:
+            response = FileResponse(open(path, 'rb'),
+                                    content_type=static_file.content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = (IMMUTABLE_CACHE_CONTROL
+                                     if static_file.immutable
+                                     else CACHE_CONTROL)
+        return response
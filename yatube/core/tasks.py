@@ -0,0 +1,180 @@
+"""Очередь фоновых задач в таблице core.Task.
+
+Медленные последствия записи (миниатюры, поисковый индекс) не
+выполняются в запросе: view сохраняет строку, ставит задачу и сразу
+отвечает. Задачу выполняет воркер — команда run_tasks, их можно
+запустить сколько угодно: строка задачи захватывается условным UPDATE,
+и одну задачу берет только один воркер.
+
+    @task(max_attempts=5)
+    def generate_thumbnail(post_id):
+        ...
+
+    generate_thumbnail.delay(post.pk)
+
+delay просто создает строку Task в текущем соединении. Внутри
+transaction.atomic задача попадает в ту же транзакцию, что и запись:
+воркер не увидит ее раньше фиксации, а откат уберет и задачу. Вне
+atomic (view работают в режиме автокоммита) строка задачи фиксируется
+сразу, поэтому delay вызывается после save — тогда воркер найдет
+сохраненную запись.
+Упавшая задача повторяется с растущей задержкой; после max_attempts
+попыток она остается в таблице со статусом failed. При TASKS_EAGER
+задачи выполняются сразу при вызове delay (разработка, тесты).
+
+Модули tasks.py приложений импортируются при старте (autodiscover),
+чтобы воркер знал все задачи по имени.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .db import use_primary
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class TaskFunction:
+    def __init__(self, func, name, max_attempts, retry_delay):
+        self.func = func
+        self.name = name
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+    def __repr__(self):
+        return f'<task {self.name}>'
+
+    @property
+    def max_attempts(self):
+        return self._max_attempts or settings.TASK_MAX_ATTEMPTS
+
+    @property
+    def retry_delay(self):
+        return self._retry_delay or settings.TASK_RETRY_DELAY
+
+    def delay(self, *args, countdown=0):
+        """Ставит задачу в очередь; аргументы должны сериализоваться
+        в JSON. Возвращает строку Task или None при TASKS_EAGER."""
+        if settings.TASKS_EAGER:
+            self.func(*args)
+            return None
+        return Task.objects.create(
+            name=self.name, args=json.dumps(args),
+            run_at=timezone.now() + timedelta(seconds=countdown))
+
+
+def task(func=None, *, name=None, max_attempts=None, retry_delay=None):
+    """Регистрирует функцию как задачу очереди."""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        if task_name in _registry:
+            raise ValueError(f'Задача {task_name} уже зарегистрирована')
+        _registry[task_name] = TaskFunction(func, task_name, max_attempts,
+                                            retry_delay)
+        return _registry[task_name]
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def autodiscover():
+    autodiscover_modules('tasks')
+
+
+def worker_name():
+    return (f'{socket.gethostname()}:{os.getpid()}:'
+            f'{threading.get_ident()}')[:100]
+
+
+def _claimable(now):
+    """Задачи, которые можно взять: пора выполнять или воркер,
+    взявший задачу, пропал дольше TASK_LOCK_TIMEOUT назад."""
+    stale = now - timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    return (Q(status=Task.QUEUED, run_at__lte=now)
+            | Q(status=Task.RUNNING, locked_at__lt=stale))
+
+
+def claim(worker):
+    """Захватывает одну задачу для worker или возвращает None.
+    Кандидаты читаются без блокировки, а захват — условный UPDATE:
+    если другой воркер успел раньше, обновится 0 строк.
+    """
+    now = timezone.now()
+    condition = _claimable(now)
+    candidates = (Task.objects.filter(condition)
+                  .order_by('run_at', 'id')
+                  .values_list('pk', flat=True)[:10])
+    for pk in candidates:
+        claimed = Task.objects.filter(condition, pk=pk).update(
+            status=Task.RUNNING, locked_by=worker, locked_at=now,
+            attempts=F('attempts') + 1)
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def _finish(task_row, **fields):
+    """Обновляет задачу, если ее не перехватил другой воркер."""
+    return Task.objects.filter(
+        pk=task_row.pk, locked_by=task_row.locked_by).update(
+        locked_by='', locked_at=None, **fields)
+
+
+def execute(task_row):
+    """Выполняет захваченную задачу. True, если она выполнена."""
+    function = _registry.get(task_row.name)
+    if function is None:
+        _finish(task_row, status=Task.FAILED,
+                last_error=f'Неизвестная задача {task_row.name}')
+        return False
+    if task_row.attempts > function.max_attempts:
+        # воркер пропал посреди последней попытки
+        _finish(task_row, status=Task.FAILED,
+                last_error=task_row.last_error or 'Воркер не завершил задачу')
+        return False
+    try:
+        # задача ставится сразу после записи: реплика может отставать
+        with use_primary():
+            function.func(*json.loads(task_row.args))
+    except Exception:
+        logger.exception('Задача %s упала (попытка %s из %s)', task_row,
+                         task_row.attempts, function.max_attempts)
+        error = traceback.format_exc()
+        if task_row.attempts >= function.max_attempts:
+            _finish(task_row, status=Task.FAILED, last_error=error)
+        else:
+            delay = function.retry_delay * 2 ** (task_row.attempts - 1)
+            _finish(task_row, status=Task.QUEUED, last_error=error,
+                    run_at=timezone.now() + timedelta(seconds=delay))
+        return False
+    Task.objects.filter(pk=task_row.pk, locked_by=task_row.locked_by).delete()
+    return True
+
+
+def run_pending(worker=None, limit=None):
+    """Выполняет задачи, пока они есть (не больше limit).
+    Возвращает число обработанных задач."""
+    worker = worker or worker_name()
+    done = 0
+    while limit is None or done < limit:
+        task_row = claim(worker)
+        if task_row is None:
+            break
+        execute(task_row)
+        done += 1
+    return done
@@ -0,0 +1,31 @@
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def read_static(path):
+    """Содержимое исходного файла статики; читается один раз."""
+    found = finders.find(path)
+    if not found:
+        raise template.TemplateSyntaxError(f'Нет файла статики {path}')
+    with open(found, encoding='utf-8') as file:
+        return file.read()
+
+
+@register.simple_tag
+def critical_css(path):
+    """Встраивает стили первого экрана в <head>, чтобы страница
+    рисовалась до загрузки основного CSS.
+
+    Использование::
+
+        {% load static_assets %}
+        {% critical_css 'css/critical.css' %}
+    """
+    css = read_static(path).replace('</', '<\\/')
+    return mark_safe(f'<style>{css}</style>')
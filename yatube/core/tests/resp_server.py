@@ -0,0 +1,135 @@
+"""Поддельный сервер RESP для тестов кеша.
+
+Понимает только команды, которыми пользуется core.cache.RespCache,
+и хранит данные в словаре. Каждое соединение обслуживается в своем
+потоке, как у настоящего сервера с несколькими клиентами.
+"""
+import socketserver
+import threading
+import time
+
+
+class Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+
+    def _alive(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, name, *args):
+        with self.lock:
+            return getattr(self, f'cmd_{name.lower()}')(*args)
+
+    def cmd_ping(self):
+        return '+PONG'
+
+    def cmd_select(self, db):
+        return '+OK'
+
+    def cmd_get(self, key):
+        return self._alive(key)
+
+    def cmd_mget(self, *keys):
+        return [self._alive(key) for key in keys]
+
+    def cmd_set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        expires = None
+        if b'PX' in options:
+            milliseconds = int(options[options.index(b'PX') + 1])
+            expires = time.monotonic() + milliseconds / 1000
+        if b'NX' in options and self._alive(key) is not None:
+            return None
+        self.data[key] = (value, expires)
+        return '+OK'
+
+    def cmd_del(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def cmd_exists(self, key):
+        return int(self._alive(key) is not None)
+
+    def cmd_pexpire(self, key, milliseconds):
+        value = self._alive(key)
+        if value is None:
+            return 0
+        self.data[key] = (value, time.monotonic() + int(milliseconds) / 1000)
+        return 1
+
+    def cmd_incrby(self, key, delta):
+        value, expires = self.data.get(key, (b'0', None))
+        try:
+            value = int(value) + int(delta)
+        except ValueError:
+            return '-ERR value is not an integer or out of range'
+        self.data[key] = (str(value).encode(), expires)
+        return value
+
+    def cmd_flushdb(self):
+        self.data.clear()
+        return '+OK'
+
+
+def encode_reply(reply):
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, str):
+        return reply.encode() + b'\r\n'
+    if isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, list):
+        return b'*%d\r\n' % len(reply) + b''.join(
+            encode_reply(item) for item in reply)
+    return b'$%d\r\n%s\r\n' % (len(reply), reply)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            command = self.read_command()
+            if command is None:
+                return
+            self.server.commands += 1
+            reply = self.server.store.execute(command[0].decode(),
+                                              *command[1:])
+            self.wfile.write(encode_reply(reply))
+
+
+class FakeRespServer(socketserver.ThreadingTCPServer):
+    """with FakeRespServer() as server: ... server.url"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.store = Store()
+        self.commands = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'redis://{host}:{port}/0'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
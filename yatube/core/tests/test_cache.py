@@ -0,0 +1,152 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.cache import RespCache, get_or_compute
+
+from .resp_server import FakeRespServer
+
+
+class RespCacheMixin:
+    def setUp(self):
+        self.server = FakeRespServer().__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.fallback_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.fallback_dir, True)
+
+    def make_cache(self, url=None):
+        return RespCache(url or self.server.url, {
+            'OPTIONS': {'FALLBACK_LOCATION': self.fallback_dir}})
+
+
+class RespCacheTest(RespCacheMixin, SimpleTestCase):
+    def test_operations(self):
+        """Кеш на сервере RESP ведет себя как кеш Django
+        """
+        cache = self.make_cache()
+        cache.set('text', 'значение')
+        cache.set('data', {'ids': [1, 2]})
+        self.assertEqual(cache.get('text'), 'значение')
+        self.assertEqual(cache.get('data'), {'ids': [1, 2]})
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.get('missing', 'default'), 'default')
+
+        self.assertFalse(cache.add('text', 'другое'))
+        self.assertTrue(cache.add('new', 1))
+        self.assertEqual(cache.incr('new', 5), 6)
+        self.assertEqual(cache.get('new'), 6)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+        cache.set_many({'a': 1, 'b': 'два'})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 'два'})
+        cache.delete_many(['a', 'b'])
+        self.assertNotIn('a', cache)
+
+        cache.set('short', 'x', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        cache.set('gone', 'x', 0)
+        self.assertNotIn('gone', cache)
+
+        cache.clear()
+        self.assertIsNone(cache.get('text'))
+
+    def test_shared_between_workers(self):
+        """Два экземпляра бэкенда (два воркера) видят одни данные
+        """
+        first, second = self.make_cache(), self.make_cache()
+        first.set('feed:generation', 10, None)
+        self.assertEqual(second.incr('feed:generation'), 11)
+        self.assertEqual(first.get('feed:generation'), 11)
+
+    def test_fallback(self):
+        """Без сервера кеш работает через файлы и не падает
+        """
+        self.server.__exit__(None, None, None)
+        cache = self.make_cache()
+        with self.assertLogs('yatube.cache', 'WARNING') as logs:
+            cache.set('key', 'value')
+            self.assertEqual(cache.get('key'), 'value')
+            # другой воркер на той же машине читает те же файлы
+            self.assertEqual(self.make_cache().get('key'), 'value')
+        # недоступный сервер не опрашивается на каждое обращение
+        self.assertEqual(len(logs.output), 2)
+
+    def test_resync_after_fallback(self):
+        """Изменения, сделанные без сервера, переносятся на сервер при
+        восстановлении связи: старое поколение лент не возвращается
+        """
+        cache = RespCache(self.server.url, {'OPTIONS': {
+            'FALLBACK_LOCATION': self.fallback_dir, 'RETRY_SECONDS': 0}})
+        cache.set('feed:generation', 10, None)
+        cache.set('feed:10:index', 'старый фрагмент')
+        cache.set('post:1', 'старая карточка')
+
+        down = mock.patch.object(cache._client, 'execute',
+                                 side_effect=ConnectionRefusedError)
+        with down, self.assertLogs('yatube.cache', 'WARNING'):
+            # на запасном кеше счетчика нет: incr падает, как у
+            # bump_feed_generation
+            with self.assertRaises(ValueError):
+                cache.incr('feed:generation')
+            cache.delete('post:1')
+            cache.set('fallback', 'x')
+
+        self.assertEqual(cache.get('feed:generation'), 11)
+        self.assertIsNone(cache.get('post:1'))
+        self.assertIsNone(cache.get('fallback'))
+        self.assertEqual(cache.get('feed:10:index'), 'старый фрагмент')
+        # запасной кеш очищен
+        self.assertIsNone(cache._fallback.get('fallback'))
+
+
+class GetOrComputeTest(RespCacheMixin, SimpleTestCase):
+    def test_single_recompute(self):
+        """Пустой ключ пересчитывает один поток, остальные ждут его
+        """
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'страница'
+
+        def worker(results):
+            results.append(get_or_compute('index', compute, 60,
+                                          cache=self.make_cache()))
+
+        results = []
+        threads = [threading.Thread(target=worker, args=(results,))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['страница'] * 8)
+
+    def test_early_recompute(self):
+        """Ключ на исходе срока пересчитывается заранее одним читателем,
+        пока остальные получают прежнее значение
+        """
+        cache = self.make_cache()
+        cache.set('index', ('старое', 1.0, time.time() + 0.5), 60)
+        self.assertEqual(
+            get_or_compute('index', lambda: 'новое', 60, cache=cache,
+                           beta=0), 'старое')
+
+        cache.add('index:lock', 1)
+        self.assertEqual(
+            get_or_compute('index', lambda: 'новое', 60, cache=cache,
+                           beta=10 ** 6), 'старое')
+        cache.delete('index:lock')
+        self.assertEqual(
+            get_or_compute('index', lambda: 'новое', 60, cache=cache,
+                           beta=10 ** 6), 'новое')
+        self.assertEqual(cache.get('index')[0], 'новое')
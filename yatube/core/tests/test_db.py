@@ -0,0 +1,79 @@
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import db
+from posts.models import Post
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_APPS=('posts',))
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        db.reset()
+        self.addCleanup(db.reset)
+        self.router = db.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_in_request(self, request):
+        """Прогоняет запрос через middleware и запоминает, откуда
+        view прочитала бы посты."""
+        used = []
+
+        def view(request):
+            used.append(self.router.db_for_read(Post))
+            if request.method == 'POST':
+                self.router.db_for_write(Post)
+            return HttpResponse()
+
+        response = db.ReplicaPinMiddleware(view)(request)
+        return used[0], response
+
+    def test_routing(self):
+        """Чтение постов идет на реплику, запись и чужие модели — в default
+        """
+        self.assertEqual(self.router.db_for_read(Post), 'replica1')
+        self.assertEqual(self.router.db_for_read(Permission), 'default')
+        with db.use_primary():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        # после записи поток читает из основной базы
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_read_your_writes(self):
+        """После записи запросы пользователя читают основную базу
+        """
+        used, response = self.read_in_request(self.factory.get('/'))
+        self.assertEqual(used, 'replica1')
+        self.assertNotIn(db.ReplicaPinMiddleware.cookie_name,
+                         response.cookies)
+
+        used, response = self.read_in_request(self.factory.post('/'))
+        self.assertEqual(used, 'default')
+        cookie = response.cookies[db.ReplicaPinMiddleware.cookie_name]
+
+        request = self.factory.get('/')
+        request.COOKIES[cookie.key] = cookie.value
+        used, _ = self.read_in_request(request)
+        self.assertEqual(used, 'default')
+
+        request = self.factory.get('/')
+        request.COOKIES[cookie.key] = '0'
+        used, _ = self.read_in_request(request)
+        self.assertEqual(used, 'replica1')
+
+
+class SQLitePragmasTest(SimpleTestCase):
+    databases = {'default'}
+
+    def test_pragmas(self):
+        """Новое соединение SQLite получает прагмы из настроек
+        """
+        with override_settings(SQLITE_PRAGMAS={'synchronous': 'NORMAL',
+                                               'temp_store': 'MEMORY'}):
+            db.configure_sqlite(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
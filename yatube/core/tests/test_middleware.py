@@ -0,0 +1,56 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+
+class PerformanceMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='test_post')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing(self):
+        """Ответ содержит метрики запроса в заголовке Server-Timing
+        """
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        self.assertIn('render;dur=', timing)
+        self.assertIn('total;dur=', timing)
+        # пустой кеш: фрагмент ленты и поколение лент не найдены
+        self.assertRegex(timing, r'cache;desc="0 hits, [1-9]\d* misses"')
+
+        response = self.client.get(reverse('posts:index'))
+        self.assertRegex(response['Server-Timing'],
+                         r'cache;desc="[1-9]\d* hits')
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_request_log(self):
+        """Медленный запрос пишется в журнал JSON-строкой
+        """
+        address = reverse('posts:profile', args=[self.user.username])
+        with self.assertLogs('yatube.slow_requests', 'WARNING') as logs:
+            self.client.get(address)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:profile')
+        self.assertEqual(record['path'], address)
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        for field in ('sql_ms', 'render_ms', 'cache_hits', 'cache_misses',
+                      'total_ms'):
+            self.assertIn(field, record)
+
+    def test_fast_request_not_logged(self):
+        """Быстрые запросы в журнал не попадают
+        """
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('yatube.slow_requests', 'WARNING'):
+                self.client.get(reverse('posts:index'))
@@ -0,0 +1,57 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+class StaticPipelineTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def test_pages_without_manifest(self):
+        """Без collectstatic адреса статики остаются исходными,
+        а критичные стили встроены в страницу
+        """
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '/static/css/bootstrap.min.css')
+        self.assertContains(response, '<style>')
+        self.assertContains(response, '.navbar{')
+
+    def test_collectstatic_and_serving(self):
+        """collectstatic пишет файлы с хешем и .gz, middleware отдает их
+        сжатыми и с кешированием на год
+        """
+        with override_settings(STATIC_ROOT=self.root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            hashed = staticfiles_storage.stored_name('css/bootstrap.min.css')
+            self.assertNotEqual(hashed, 'css/bootstrap.min.css')
+            path = os.path.join(self.root, hashed)
+            self.assertTrue(os.path.exists(path + '.gz'))
+
+            response = self.client.get(reverse('posts:index'))
+            self.assertContains(response, f'/static/{hashed}')
+
+            url = f'/static/{hashed}'
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertIn('immutable', response['Cache-Control'])
+            with open(path, 'rb') as file:
+                self.assertEqual(
+                    gzip.decompress(b''.join(response.streaming_content)),
+                    file.read())
+
+            response = self.client.get(url,
+                                       HTTP_IF_NONE_MATCH=response['ETag'],
+                                       HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response.status_code, 304)
+
+            response = self.client.get('/static/css/bootstrap.min.css')
+            self.assertNotIn('Content-Encoding', response)
+            self.assertNotIn('immutable', response['Cache-Control'])
@@ -0,0 +1,94 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import tasks
+from core.models import Task
+
+calls = []
+
+
+@tasks.task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@tasks.task(name='tests.flaky', max_attempts=2, retry_delay=60)
+def flaky(value):
+    calls.append(value)
+    raise RuntimeError('сбой')
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_and_run(self):
+        """delay ставит задачу в таблицу, воркер выполняет и удаляет ее
+        """
+        task_row = record.delay('a')
+        self.assertEqual(json.loads(task_row.args), ['a'])
+        self.assertEqual(calls, [])
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(calls, ['a'])
+        self.assertFalse(Task.objects.exists())
+
+        record.delay('later', countdown=60)
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_retry_and_fail(self):
+        """Упавшая задача откладывается, после всех попыток — failed
+        """
+        task_row = flaky.delay('x')
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_pending(), 1)
+        task_row.refresh_from_db()
+        self.assertEqual(task_row.status, Task.QUEUED)
+        self.assertEqual(task_row.attempts, 1)
+        self.assertIn('RuntimeError', task_row.last_error)
+        self.assertGreater(task_row.run_at,
+                           timezone.now() + timedelta(seconds=50))
+        self.assertEqual(tasks.run_pending(), 0)
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_pending(), 1)
+        task_row.refresh_from_db()
+        self.assertEqual(task_row.status, Task.FAILED)
+        self.assertEqual(calls, ['x', 'x'])
+
+    def test_claim(self):
+        """Задачу берет один воркер; задачу пропавшего воркера
+        берут снова после TASK_LOCK_TIMEOUT
+        """
+        task_row = record.delay('a')
+        self.assertEqual(tasks.claim('first').pk, task_row.pk)
+        self.assertIsNone(tasks.claim('second'))
+
+        Task.objects.update(
+            locked_at=timezone.now() - timedelta(hours=1))
+        claimed = tasks.claim('second')
+        self.assertEqual(claimed.locked_by, 'second')
+        self.assertEqual(claimed.attempts, 2)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager(self):
+        """При TASKS_EAGER задача выполняется сразу
+        """
+        self.assertIsNone(record.delay('now'))
+        self.assertEqual(calls, ['now'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_run_tasks_command(self):
+        """Команда run_tasks --once выполняет очередь и выходит
+        """
+        record.delay('a')
+        record.delay('b')
+        out = StringIO()
+        call_command('run_tasks', '--once', stdout=out)
+        self.assertEqual(calls, ['a', 'b'])
+        self.assertIn('Выполнено задач: 2', out.getvalue())
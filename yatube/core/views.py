@@ -1,3 +1,4 @@
+from django.http import JsonResponse
 from django.shortcuts import render
 
 
@@ -8,4 +9,10 @@ def page_not_found(request, exception):
 
 
 def csrf_failure(request, reason=''):
-    return render(request, 'core/403csrf.html')
+    # клиентам API — ошибка в JSON, а не HTML-страница
+    match = request.resolver_match
+    if match is not None and match.namespace == 'api':
+        return JsonResponse({'detail': f'Ошибка CSRF: {reason}'},
+                            status=403,
+                            json_dumps_params={'ensure_ascii': False})
+    return render(request, 'core/403csrf.html', status=403)
@@ -1,9 +1,29 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
 
-from .models import Comment, Follow, Group, Post
+from .export import stream_jsonl_gz
+from .models import Comment, Follow, Group, MediaBlob, Post, PostImageVariant
 
+EXPORT_NAMES = {Post: 'post', Comment: 'comment', Follow: 'follow'}
 
-class PostAdmin(admin.ModelAdmin):
+
+def export_jsonl(modeladmin, request, queryset):
+    name = EXPORT_NAMES[queryset.model]
+    response = StreamingHttpResponse(stream_jsonl_gz(name, queryset),
+                                     content_type='application/gzip')
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.jsonl.gz"')
+    return response
+
+
+export_jsonl.short_description = 'Выгрузить выбранное в JSONL.gz'
+
+
+class ExportAdmin(admin.ModelAdmin):
+    actions = (export_jsonl,)
+
+
+class PostAdmin(ExportAdmin):
     list_display = ('pk',
                     'text',
                     'pub_date',
@@ -16,7 +36,20 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class PostImageVariantAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'post', 'format', 'width', 'size', 'source_size')
+    list_filter = ('format', 'width')
+
+
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'refcount', 'created', 'updated')
+    list_filter = ('refcount',)
+    search_fields = ('name',)
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Comment, ExportAdmin)
+admin.site.register(Follow, ExportAdmin)
+admin.site.register(PostImageVariant, PostImageVariantAdmin)
+admin.site.register(MediaBlob, MediaBlobAdmin)
@@ -0,0 +1,151 @@
+"""Замер числа запросов и задержек для всех адресов posts.urls.
+
+Каждый адрес запрашивается тестовым клиентом с пустым кешем,
+для каждого замера собираются метрики core.metrics. Результаты
+сравниваются с базовым JSON-файлом: рост числа запросов — всегда
+регрессия, рост времени — только на том же наборе данных.
+"""
+import json
+import statistics
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from core.metrics import collect
+
+from .models import Follow, Group, Post, User
+from .urls import urlpatterns
+
+METRICS = ('queries', 'sql_ms', 'render_ms', 'total_ms')
+
+
+def pick_actors():
+    """Выбирает из данных автора, читателя, группу и пост."""
+    author = User.objects.annotate(
+        posts=Count('post')).order_by('-posts', 'pk').first()
+    reader = User.objects.annotate(
+        follows=Count('follower')).order_by('-follows', 'pk').first()
+    followed = reader.follower.values('author')
+    target = (User.objects.exclude(pk__in=followed)
+              .exclude(pk=reader.pk).order_by('pk').first())
+    post = Post.objects.filter(author=author).annotate(
+        comments=Count('comment')).order_by('-comments', '-pk').first()
+    group = Group.objects.annotate(
+        posts=Count('post')).order_by('-posts', 'pk').first()
+    return {'author': author, 'reader': reader, 'target': target,
+            'post': post, 'group': group}
+
+
+def routes(actors):
+    """(имя, метод, адрес, данные, пользователь) для каждого адреса.
+    profile_follow идет перед profile_unfollow, чтобы отписка
+    всегда находила подписку.
+    """
+    author, reader, target = (actors['author'], actors['reader'],
+                              actors['target'])
+    post_id = actors['post'].id
+    return [
+        ('index', 'get', reverse('posts:index'), None, None),
+        ('group_index', 'get', reverse('posts:group_index'), None, None),
+        ('group_list', 'get',
+         reverse('posts:group_list', args=[actors['group'].slug]),
+         None, None),
+        ('profile', 'get', reverse('posts:profile', args=[author.username]),
+         None, reader),
+        ('post_detail', 'get', reverse('posts:post_detail', args=[post_id]),
+         None, reader),
+        ('post_comments', 'get',
+         reverse('posts:post_comments', args=[post_id]), None, reader),
+        ('post_edit', 'get', reverse('posts:post_edit', args=[post_id]),
+         None, author),
+        ('post_create', 'get', reverse('posts:post_create'), None, author),
+        ('add_comment', 'post', reverse('posts:add_comment', args=[post_id]),
+         {'text': 'Комментарий из бенчмарка'}, reader),
+        ('follow_index', 'get', reverse('posts:follow_index'), None, reader),
+        ('search', 'get', reverse('posts:search'),
+         {'q': 'погода и коты'}, None),
+        ('profile_follow', 'get',
+         reverse('posts:profile_follow', args=[target.username]),
+         None, reader),
+        ('profile_unfollow', 'get',
+         reverse('posts:profile_unfollow', args=[target.username]),
+         None, reader),
+        ('api:posts', 'get', reverse('api:posts'), None, None),
+        ('api:post', 'get', reverse('api:post', args=[post_id]), None, None),
+        ('api:comments', 'get', reverse('api:comments', args=[post_id]),
+         None, None),
+        ('api:follow', 'get', reverse('api:follow'), None, reader),
+    ]
+
+
+def missing_routes(measured):
+    """Адреса posts.urls, которые не попали в замер."""
+    names = {pattern.name for pattern in urlpatterns}
+    return sorted(names - set(measured))
+
+
+def run(repeat=3):
+    """Замеряет все адреса repeat раз и возвращает медианы."""
+    actors = pick_actors()
+    plan = routes(actors)
+    clients = {}
+    samples = {name: [] for name, *_ in plan}
+    for attempt in range(repeat + 1):
+        for name, method, address, data, user in plan:
+            client = clients.get(user)
+            if client is None:
+                client = clients[user] = Client()
+                if user is not None:
+                    client.force_login(user)
+            cache.clear()
+            with collect() as metrics:
+                response = getattr(client, method)(address, data or {})
+            if response.status_code >= 400:
+                raise AssertionError(
+                    f'{name}: {address} ответил {response.status_code}')
+            # первый проход прогревает соединения и шаблоны
+            if attempt:
+                samples[name].append(metrics.as_dict())
+    # после бенчмарка подписка читателя остается такой же, как до него
+    Follow.objects.filter(user=actors['reader'],
+                          author=actors['target']).delete()
+    return {
+        name: {metric: statistics.median(s[metric] for s in runs)
+               for metric in METRICS}
+        for name, runs in samples.items()
+    }
+
+
+def compare(results, baseline, tolerance=0.5, slack_ms=25.0,
+            check_time=True):
+    """Список регрессий относительно baseline['routes']."""
+    failures = []
+    for name, current in sorted(results.items()):
+        base = baseline.get('routes', {}).get(name)
+        if base is None:
+            continue
+        if current['queries'] > base['queries']:
+            failures.append(f"{name}: запросов {current['queries']:g} "
+                            f"вместо {base['queries']:g}")
+        limit = base['total_ms'] * (1 + tolerance) + slack_ms
+        if check_time and current['total_ms'] > limit:
+            failures.append(f"{name}: {current['total_ms']:.1f} мс "
+                            f"при пороге {limit:.1f} мс")
+    return failures
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, dataset, results):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'dataset': dataset, 'routes': results}, file,
+                  indent=2, sort_keys=True, ensure_ascii=False)
+        file.write('\n')
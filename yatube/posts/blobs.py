@@ -0,0 +1,185 @@
+"""Ссылки на картинки постов и сборка мусора в media.
+
+Сигналы Post (posts.signals) ведут в MediaBlob число постов с каждой
+картинкой хранилища posts.storage: новая картинка прибавляет ссылку,
+замененная в post_edit или картинка удаленного поста — убавляет.
+Массовые update() и delete() сигналов не шлют, поэтому счетчики можно
+пересчитать по данным (rebuild, manage.py collect_media --recount).
+
+collect удаляет файлы старше grace секунд, на которые ничто не ссылается:
+картинки с нулевым счетчиком и файлы в posts/ без строки MediaBlob
+(загрузки, чей пост так и не сохранился), копии для srcset без строки
+PostImageVariant или сделанные из прежней картинки поста (картинку
+заменили или убрали) и миниатюры sorl-thumbnail, которых нет в
+Post.thumbnail. После этого из хранилища ключей sorl убираются ссылки
+на пропавшие файлы.
+"""
+import os
+import posixpath
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from sorl.thumbnail import default as thumbnail_default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from .models import MediaBlob, Post, PostImageVariant
+
+IMAGES_DIR = 'posts'
+VARIANTS_DIR = 'posts/variants'
+
+
+def image_storage():
+    return Post._meta.get_field('image').storage
+
+
+def _shift(name, delta):
+    return MediaBlob.objects.filter(name=name).update(
+        refcount=F('refcount') + delta, updated=timezone.now())
+
+
+def _create_blob(name):
+    try:
+        size = image_storage().size(name)
+    except OSError:
+        size = 0
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(
+                name=name, size=size,
+                refcount=Post.objects.filter(image=name).count())
+    except IntegrityError:
+        # строку успел создать соседний запрос, возможно не увидев
+        # нашего поста
+        _shift(name, 1)
+
+
+def add_reference(name):
+    if name and not _shift(name, 1):
+        _create_blob(name)
+
+
+def drop_reference(name):
+    if name:
+        _shift(name, -1)
+
+
+def _references():
+    return (Post.objects.filter(image=OuterRef('name'))
+            .order_by()
+            .values('image')
+            .annotate(total=Count('pk'))
+            .values('total'))
+
+
+def rebuild():
+    """Пересчитывает счетчики по Post.image и заводит строки для
+    картинок, у которых их нет."""
+    referenced = set(Post.objects.exclude(image='')
+                     .values_list('image', flat=True))
+    known = set(MediaBlob.objects.values_list('name', flat=True))
+    for name in referenced - known:
+        _create_blob(name)
+    MediaBlob.objects.update(
+        refcount=Coalesce(Subquery(_references()), 0))
+
+
+def walk(storage, path, skip=()):
+    """Имена всех файлов под path, кроме каталогов skip."""
+    try:
+        directories, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        directory = posixpath.join(path, directory)
+        if directory not in skip:
+            yield from walk(storage, directory, skip)
+
+
+def collect(grace=None, dry_run=False):
+    """Удаляет файлы без ссылок; возвращает Counter удаленного:
+    images, variants, thumbnails."""
+    if grace is None:
+        grace = settings.MEDIA_GC_GRACE
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    removed = Counter()
+
+    def stale(storage, name):
+        try:
+            return storage.get_modified_time(name) < cutoff
+        except OSError:
+            return False
+
+    def remove(kind, storage, name):
+        removed[kind] += 1
+        if not dry_run:
+            storage.delete(name)
+
+    storage = image_storage()
+    referenced = set(Post.objects.exclude(image='')
+                     .values_list('image', flat=True))
+    orphans = MediaBlob.objects.filter(refcount__lte=0, updated__lt=cutoff)
+    for blob in orphans.iterator():
+        # счетчик мог отстать после массовых операций
+        if blob.name in referenced:
+            continue
+        if storage.exists(blob.name):
+            # файл только что загрузили заново (posts.storage)
+            if not stale(storage, blob.name):
+                continue
+            remove('images', storage, blob.name)
+        if not dry_run:
+            blob.delete()
+
+    known = referenced | set(MediaBlob.objects.values_list('name',
+                                                           flat=True))
+    for name in walk(storage, IMAGES_DIR, skip={VARIANTS_DIR}):
+        if name not in known and stale(storage, name):
+            remove('images', storage, name)
+
+    # копии прежней картинки поста не нужны: для поста без картинки
+    # новых не будет, а для новой картинки generate сделает свои
+    outdated = PostImageVariant.objects.exclude(source=F('post__image'))
+    known = set(PostImageVariant.objects.filter(source=F('post__image'))
+                .values_list('name', flat=True))
+    for name in walk(default_storage, VARIANTS_DIR):
+        if name not in known and stale(default_storage, name):
+            remove('variants', default_storage, name)
+    if not dry_run:
+        outdated.delete()
+        _remove_empty_directories(default_storage, VARIANTS_DIR, cutoff)
+
+    thumbnails = thumbnail_default.storage
+    known = {url[len(settings.MEDIA_URL):]
+             for url in Post.objects.exclude(thumbnail='')
+             .values_list('thumbnail', flat=True)}
+    prefix = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+    for name in walk(thumbnails, prefix):
+        if name not in known and stale(thumbnails, name):
+            remove('thumbnails', thumbnails, name)
+    if removed and not dry_run:
+        thumbnail_default.kvstore.cleanup()
+    return removed
+
+
+def _remove_empty_directories(storage, path, cutoff):
+    """Каталоги копий удаленных постов; свежие не трогаем: в них как
+    раз могут сохраняться новые копии."""
+    try:
+        directories, _ = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for directory in directories:
+        directory = posixpath.join(path, directory)
+        try:
+            if storage.get_modified_time(directory) < cutoff:
+                os.rmdir(storage.path(directory))
+        except OSError:
+            pass
@@ -0,0 +1,106 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+FEED_GENERATION_KEY = 'feed:generation'
+FEED_MODIFIED_KEY = 'feed:modified'
+GROUPS_VERSION_KEY = 'groups:version'
+CARDS_VERSION_KEY = 'post_card:version'
+
+
+def feed_generation():
+    """Текущее поколение лент.
+    Начальное значение берется от времени, чтобы после вытеснения
+    счетчика из кеша не ожили фрагменты старых поколений.
+    """
+    generation = cache.get(FEED_GENERATION_KEY)
+    if generation is None:
+        generation = int(time.time())
+        if not cache.add(FEED_GENERATION_KEY, generation, None):
+            return cache.get(FEED_GENERATION_KEY, generation)
+    return generation
+
+
+def bump_feed_generation():
+    """Делает недействительными все закешированные страницы лент."""
+    cache.set(FEED_MODIFIED_KEY, time.time(), None)
+    try:
+        return cache.incr(FEED_GENERATION_KEY)
+    except ValueError:
+        return feed_generation()
+
+
+def groups_version():
+    """Версия справочника групп (posts.groups).
+    Процессы держат справочник у себя и сверяют только версию, поэтому
+    начальное значение берется от времени в наносекундах: после
+    вытеснения ключа новая версия не совпадет ни с одной старой.
+    """
+    version = cache.get(GROUPS_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(GROUPS_VERSION_KEY, version, None):
+            return cache.get(GROUPS_VERSION_KEY, version)
+    return version
+
+
+def bump_groups_version():
+    """Справочник групп пересоберется при следующем обращении."""
+    try:
+        return cache.incr(GROUPS_VERSION_KEY)
+    except ValueError:
+        return groups_version()
+
+
+def cards_version():
+    """Версия карточек постов: поднимается, когда меняются автор или
+    группа, которые выводятся в карточке, но не меняют post.updated_at.
+    Начальное значение — от времени, как у groups_version.
+    """
+    version = cache.get(CARDS_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(CARDS_VERSION_KEY, version, None):
+            return cache.get(CARDS_VERSION_KEY, version)
+    return version
+
+
+def bump_cards_version():
+    """Все карточки постов отрисуются заново."""
+    try:
+        return cache.incr(CARDS_VERSION_KEY)
+    except ValueError:
+        return cards_version()
+
+
+def feed_last_modified():
+    """Время последнего изменения лент или None, если оно неизвестно."""
+    modified = cache.get(FEED_MODIFIED_KEY)
+    if modified is None:
+        return None
+    return datetime.fromtimestamp(modified, timezone.utc)
+
+
+def feed_cache_key(feed, vary_on=()):
+    """Ключ фрагмента ленты: тип ленты, страница/курсор и поколение."""
+    vary = hashlib.md5(
+        ':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    return f'feed:{feed}:{feed_generation()}:{vary}'
+
+
+def feed_cache_timeout():
+    return getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 60)
+
+
+def post_card_key(post, variant, version):
+    """Ключ карточки поста: меняется вместе с post.updated_at и версией
+    карточек (cards_version)."""
+    stamp = int(post.updated_at.timestamp() * 1000000)
+    return f'post_card:{variant}:{version}:{post.pk}:{stamp}'
+
+
+def post_card_timeout():
+    return getattr(settings, 'POST_CARD_TIMEOUT', 60 * 60 * 24)
@@ -0,0 +1,54 @@
+"""Журнал изменений постов и комментариев (change feed).
+
+Каждое сохранение и удаление Post и Comment добавляет строку в
+ChangeLog сигналом post_save / post_delete, сразу после записи. В одной
+транзакции с записью строка оказывается только внутри
+transaction.atomic; view работают в режиме автокоммита, и если процесс
+упадет между двумя запросами, запись останется без строки журнала.
+
+Потребители (кеши, поисковый индекс, выгрузки) читают журнал с места,
+где остановились: changes_since() отдает записи с id больше курсора и
+курсор для следующего чтения.
+id растут монотонно, а SQLite выполняет записи по одной, поэтому
+запись с меньшим id не может появиться позже уже прочитанной.
+
+bulk_create и QuerySet.update() сигналов не вызывают и в журнал
+не попадают.
+"""
+from django.conf import settings
+
+from .models import ChangeLog, Comment, Post
+
+MODEL_NAMES = {Post: 'post', Comment: 'comment'}
+
+
+def changes_limit():
+    return getattr(settings, 'CHANGES_LIMIT', 500)
+
+
+def record(instance, action):
+    ChangeLog.objects.create(model=MODEL_NAMES[type(instance)],
+                             object_id=instance.pk,
+                             action=action)
+
+
+def parse_since(value):
+    """Курсор из параметра since; пустой курсор — чтение с начала."""
+    if not value:
+        return 0
+    since = int(value)
+    if since < 0:
+        raise ValueError('Курсор не может быть отрицательным')
+    return since
+
+
+def changes_since(since=0, model=None, limit=None):
+    """Записи журнала после курсора since и курсор для продолжения."""
+    entries = ChangeLog.objects.filter(id__gt=since)
+    if model is not None:
+        entries = entries.filter(model=model)
+    rows = list(entries.order_by('id').values(
+        'id', 'model', 'object_id', 'action', 'changed_at',
+    )[:limit or changes_limit()])
+    cursor = rows[-1]['id'] if rows else since
+    return rows, cursor
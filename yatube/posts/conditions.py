@@ -0,0 +1,95 @@
+"""Условные ответы (ETag) для страниц постов.
+
+Для каждой страницы дешево, одним запросом по индексу, считается
+отпечаток всего, что на ней видно: для ленты группы и профиля это
+поколение лент, для поста — его updated_at, комментарии и версия
+карточек (имена пользователей и группы). Если отпечаток совпал с
+If-None-Match, отвечаем 304 до выборки постов и рендера шаблона.
+
+Страницы зависят от пользователя (шапка, кнопки подписки и
+редактирования, CSRF-токен в форме комментария), поэтому в отпечаток
+входят id пользователя и CSRF-cookie, а ответ помечается Vary: Cookie.
+Last-Modified эти страницы не отдают: по времени не понять, что страницу
+смотрит другой посетитель или что изменились счетчики, и
+If-Modified-Since давал бы неверный 304.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .cache import cards_version, feed_generation, groups_version
+from .models import AuthorStats, Post
+
+
+def viewer_key(request):
+    """Часть отпечатка, зависящая от посетителя."""
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return '{}-{}'.format(request.user.pk or 0,
+                          hashlib.md5(csrf.encode()).hexdigest()[:8])
+
+
+def make_etag(*parts):
+    return hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def group_etag(request, slug):
+    return make_etag('group', slug, feed_generation(), viewer_key(request))
+
+
+def groups_etag(request):
+    return make_etag('groups', groups_version(), viewer_key(request))
+
+
+def profile_etag(request, username):
+    stats = AuthorStats.objects.filter(user__username=username).values_list(
+        'post_count', 'follower_count', 'following_count').first()
+    return make_etag('profile', username, feed_generation(), stats,
+                     viewer_key(request))
+
+
+def post_state(request, post_id):
+    """Все, что видно на странице поста, одним запросом: время
+    изменения поста и его последнего комментария, число комментариев,
+    счетчик постов автора и группа. Результат запоминается на request.
+    """
+    if not hasattr(request, '_post_state'):
+        request._post_state = Post.objects.filter(pk=post_id).annotate(
+            last_comment=Max('comment__updated_at'),
+        ).values_list('updated_at', 'last_comment', 'comment_count',
+                      'author__stats__post_count', 'group__title').first()
+    return request._post_state
+
+
+def post_detail_etag(request, post_id):
+    state = post_state(request, post_id)
+    if state is None:
+        return None
+    # имена автора и комментаторов и slug группы в post_state не входят:
+    # их правки поднимают версию карточек
+    return make_etag('post', post_id, *state, cards_version(),
+                     viewer_key(request))
+
+
+def conditional_page(etag_func):
+    """Отвечает 304 на неизменную страницу и разрешает кешам хранить
+    ее только с обязательной проверкой (Cache-Control: no-cache).
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, public=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,85 @@
+"""Денормализованные счетчики постов, подписок и комментариев.
+
+Значения меняются атомарно выражениями F(), без COUNT(*) на чтении.
+Если строки AuthorStats еще нет, она создается по реальным данным,
+которые к этому моменту уже учитывают изменение.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+STATS_FIELDS = {
+    'post_count': (Post, 'author'),
+    'follower_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def _create_stats(user_id):
+    values = {
+        name: model.objects.filter(**{f'{field}_id': user_id}).count()
+        for name, (model, field) in STATS_FIELDS.items()
+    }
+    try:
+        with transaction.atomic():
+            AuthorStats.objects.create(user_id=user_id, **values)
+    except IntegrityError:
+        pass
+
+
+def change(user_id, **deltas):
+    """change(user.id, post_count=1): атомарно сдвигает счетчики.
+    Отсутствующая строка создается только при росте счетчиков:
+    при удалениях (в том числе каскадных) ее создаст get_stats.
+    """
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        **{name: F(name) + delta for name, delta in deltas.items()})
+    if not updated and min(deltas.values()) > 0:
+        _create_stats(user_id)
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta)
+
+
+def get_stats(user):
+    """Счетчики пользователя; строка создается при первом обращении."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        _create_stats(user.pk)
+        return AuthorStats.objects.get(user_id=user.pk)
+
+
+def rebuild():
+    """Пересчитывает все счетчики по реальным данным."""
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True)
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=pk) for pk in missing.iterator()),
+        ignore_conflicts=True,
+    )
+    AuthorStats.objects.update(**{
+        name: _count_subquery(model, field)
+        for name, (model, field) in STATS_FIELDS.items()
+    })
+    Post.objects.update(comment_count=Coalesce(Subquery(
+        Comment.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0))
@@ -0,0 +1,219 @@
+"""Массовая загрузка данных: генерация синтетики и импорт JSONL/CSV.
+
+Строки создаются пачками через bulk_create, каждая пачка в своей
+транзакции, поэтому память ограничена размером пачки. Сигналы при
+этом не срабатывают: производные данные (счетчики, ленты подписок,
+поисковый индекс) пересчитываются отдельно в rebuild_derived().
+"""
+import csv
+import gzip
+import io
+import json
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 1000
+RECORD_TYPES = ('user', 'group', 'post', 'comment', 'follow')
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил заданные даты."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def date_fields():
+    return (Post._meta.get_field('pub_date'),
+            Comment._meta.get_field('created'))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _last_pk(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def _ids_after(model, pk):
+    """Первичные ключи строк, созданных после pk, в компактном массиве."""
+    return array('q', model.objects.filter(pk__gt=pk)
+                 .order_by('pk').values_list('pk', flat=True).iterator())
+
+
+def _bulk(model, objects, batch_size):
+    for chunk in chunked(objects, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+def generate(users=50, groups=5, posts=500, comments=1000, follows=200,
+             prefix='bench', seed=0, batch_size=BATCH_SIZE):
+    """Создает пользователей, группы, посты, комментарии и подписки.
+    Посты и комментарии получают даты, растянутые назад во времени.
+    Повторяющиеся пары подписок пропускаются, поэтому подписок может
+    получиться немного меньше follows.
+    """
+    rnd = random.Random(seed)
+    password = make_password(None)
+    marks = {model: _last_pk(model) for model in (User, Group, Post)}
+    _bulk(User, (User(username=f'{prefix}_user_{i}', password=password)
+                 for i in range(users)), batch_size)
+    _bulk(Group, (Group(title=f'{prefix} группа {i}',
+                        slug=f'{prefix}-group-{i}',
+                        description=f'Описание группы {i}')
+                  for i in range(groups)), batch_size)
+    user_ids = _ids_after(User, marks[User])
+    group_ids = list(_ids_after(Group, marks[Group])) + [None]
+
+    now = timezone.now()
+    with explicit_dates(*date_fields()):
+        _bulk(Post, (Post(text=f'Пост номер {i} про погоду и котов',
+                          author_id=rnd.choice(user_ids),
+                          group_id=rnd.choice(group_ids),
+                          pub_date=now - timedelta(minutes=i))
+                     for i in range(posts)), batch_size)
+        post_ids = _ids_after(Post, marks[Post])
+        if post_ids:
+            _bulk(Comment, (Comment(text=f'Комментарий {i}',
+                                    post_id=rnd.choice(post_ids),
+                                    author_id=rnd.choice(user_ids),
+                                    created=now - timedelta(seconds=i))
+                            for i in range(comments)), batch_size)
+
+    if len(user_ids) > 1:
+        _bulk(Follow, (Follow(user_id=user_id, author_id=author_id)
+                       for user_id, author_id in (
+                           rnd.sample(user_ids, 2) for _ in range(follows))),
+              batch_size)
+    return {'users': users, 'groups': groups, 'posts': posts,
+            'comments': comments, 'follows': follows}
+
+
+def read_jsonl(file):
+    """Записи из JSONL: по одному объекту с полем type в строке."""
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(file, record_type):
+    """Записи из CSV, где все строки одного типа record_type."""
+    for row in csv.DictReader(file):
+        yield {'type': record_type, **row}
+
+
+def open_text(path):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8')
+    return open(path, encoding='utf-8', newline='')
+
+
+def _lookup(model, field, values):
+    """{значение поля: pk} одним запросом на пачку."""
+    values = {value for value in values if value}
+    if not values:
+        return {}
+    return dict(model.objects.filter(**{f'{field}__in': values})
+                .values_list(field, 'pk'))
+
+
+def _date(value, default):
+    return (parse_datetime(value) if value else None) or default
+
+
+def _build(records, password, now):
+    """Превращает пачку записей в объекты моделей по типам."""
+    by_type = {record_type: [] for record_type in RECORD_TYPES}
+    for record in records:
+        record_type = record.get('type')
+        if record_type not in by_type:
+            raise ValueError(f'Неизвестный тип записи: {record_type!r}')
+        by_type[record_type].append(record)
+
+    yield User, [User(username=r['username'],
+                      first_name=r.get('first_name', ''),
+                      last_name=r.get('last_name', ''),
+                      email=r.get('email', ''),
+                      password=password)
+                 for r in by_type['user']]
+    yield Group, [Group(title=r['title'], slug=r['slug'],
+                        description=r.get('description', ''))
+                  for r in by_type['group']]
+
+    users = _lookup(User, 'username', [
+        r.get('author') for r in by_type['post'] + by_type['comment']
+    ] + [r.get('user') for r in by_type['follow']]
+      + [r.get('author') for r in by_type['follow']])
+    groups = _lookup(Group, 'slug', [r.get('group')
+                                     for r in by_type['post']])
+    yield Post, [Post(id=r.get('id') or None,
+                      text=r['text'],
+                      author_id=users[r['author']],
+                      group_id=groups.get(r.get('group')),
+                      pub_date=_date(r.get('pub_date'), now))
+                 for r in by_type['post']]
+    yield Comment, [Comment(text=r['text'],
+                            post_id=r['post'],
+                            author_id=users[r['author']],
+                            created=_date(r.get('created'), now))
+                    for r in by_type['comment']]
+    yield Follow, [Follow(user_id=users[r['user']],
+                          author_id=users[r['author']])
+                   for r in by_type['follow']
+                   if r['user'] != r['author']]
+
+
+def load(records, batch_size=BATCH_SIZE):
+    """Загружает поток записей пачками; возвращает число записей по типам.
+
+    Пользователи и группы пачки создаются раньше постов, поэтому
+    ссылки по username и slug работают внутри пачки. Посты можно
+    загружать с явным id, чтобы на них ссылались комментарии.
+    """
+    password = make_password(None)
+    now = timezone.now()
+    loaded = dict.fromkeys(RECORD_TYPES, 0)
+    names = dict(zip((User, Group, Post, Comment, Follow), RECORD_TYPES))
+    with explicit_dates(*date_fields()):
+        for chunk in chunked(records, batch_size):
+            with transaction.atomic():
+                # пачка строится лениво: ссылки на пользователей и группы
+                # ищутся после того, как они созданы
+                for model, objects in _build(chunk, password, now):
+                    model.objects.bulk_create(objects,
+                                              ignore_conflicts=True)
+                    loaded[names[model]] += len(objects)
+    return loaded
+
+
+def rebuild_derived():
+    """Пересчитывает данные, которые обычно ведут сигналы."""
+    counters.rebuild()
+    timeline.rebuild()
+    search.rebuild()
@@ -0,0 +1,158 @@
+"""Потоковая выгрузка постов, комментариев и подписок.
+
+Строки читаются пачками по первичному ключу (id > последнего
+выгруженного) через values().iterator(), поэтому память не зависит
+от размера таблицы, а сортировка по умолчанию (Post.Meta.ordering)
+не используется. Записи совместимы с форматом JSONL команды load_data.
+
+Каждая пачка в файле .gz пишется отдельным gzip-членом: после пачки
+файл заканчивается целым архивом, его смещение и последний id
+сохраняются в контрольной точке. Продолжение выгрузки обрезает файл
+до смещения из контрольной точки и дописывает следующие пачки, так что
+строки не дублируются и не теряются.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Follow, Post
+
+BATCH_SIZE = 5000
+
+
+def _post(row):
+    return {'type': 'post', 'id': row['id'], 'text': row['text'],
+            'pub_date': row['pub_date'], 'updated_at': row['updated_at'],
+            'author': row['author__username'], 'group': row['group__slug'],
+            'image': row['image'], 'comment_count': row['comment_count']}
+
+
+def _comment(row):
+    return {'type': 'comment', 'id': row['id'], 'post': row['post_id'],
+            'author': row['author__username'], 'text': row['text'],
+            'created': row['created'], 'updated_at': row['updated_at']}
+
+
+def _follow(row):
+    return {'type': 'follow', 'id': row['id'],
+            'user': row['user__username'],
+            'author': row['author__username']}
+
+
+EXPORTS = {
+    'post': (Post, ('id', 'text', 'pub_date', 'updated_at',
+                    'author__username', 'group__slug', 'image',
+                    'comment_count'), _post),
+    'comment': (Comment, ('id', 'post_id', 'author__username', 'text',
+                          'created', 'updated_at'), _comment),
+    'follow': (Follow, ('id', 'user__username', 'author__username'),
+               _follow),
+}
+
+
+def iter_batches(name, queryset=None, after=0, batch_size=BATCH_SIZE):
+    """Пачки записей после id=after; queryset сужает выгрузку."""
+    model, fields, to_record = EXPORTS[name]
+    if queryset is None:
+        queryset = model.objects.all()
+    while True:
+        rows = (queryset.filter(id__gt=after)
+                .order_by('id')
+                .values(*fields)[:batch_size])
+        batch = [to_record(row)
+                 for row in rows.iterator(chunk_size=batch_size)]
+        if not batch:
+            return
+        after = batch[-1]['id']
+        yield batch
+
+
+def format_jsonl(batch, header=False):
+    return ''.join(json.dumps(record, cls=DjangoJSONEncoder,
+                              ensure_ascii=False) + '\n'
+                   for record in batch)
+
+
+def format_csv(batch, header=False):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(batch[0]))
+    if header:
+        writer.writeheader()
+    for record in batch:
+        writer.writerow({key: value.isoformat()
+                         if hasattr(value, 'isoformat') else value
+                         for key, value in record.items()})
+    return buffer.getvalue()
+
+
+FORMATS = {'jsonl': format_jsonl, 'csv': format_csv}
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+
+def checkpoint_path(path):
+    return f'{path}.checkpoint'
+
+
+def read_checkpoint(path):
+    try:
+        with open(checkpoint_path(path), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, state):
+    """Атомарно заменяет контрольную точку: сначала временный файл."""
+    temporary = checkpoint_path(path) + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(state, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, checkpoint_path(path))
+
+
+def export(name, path, fmt=None, batch_size=BATCH_SIZE, resume=False):
+    """Выгружает таблицу name в файл path; возвращает число записей.
+    При resume продолжает с контрольной точки, если она есть.
+    """
+    fmt = fmt or detect_format(path)
+    compress = path.endswith('.gz')
+    state = read_checkpoint(path) if resume else None
+    if state is not None and state['model'] != name:
+        raise ValueError(f'Контрольная точка {path} относится к '
+                         f'выгрузке {state["model"]}')
+    if state is None:
+        state = {'model': name, 'last_id': 0, 'offset': 0, 'rows': 0}
+    mode = 'r+b' if state['offset'] else 'wb'
+    with open(path, mode) as file:
+        file.seek(state['offset'])
+        file.truncate()
+        for batch in iter_batches(name, after=state['last_id'],
+                                  batch_size=batch_size):
+            data = FORMATS[fmt](batch, header=not state['rows']).encode()
+            file.write(gzip.compress(data) if compress else data)
+            file.flush()
+            os.fsync(file.fileno())
+            state.update(last_id=batch[-1]['id'], offset=file.tell(),
+                         rows=state['rows'] + len(batch))
+            write_checkpoint(path, state)
+    return state['rows']
+
+
+def stream_jsonl_gz(name, queryset, batch_size=BATCH_SIZE):
+    """Генератор байтов gzip JSONL для StreamingHttpResponse."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for batch in iter_batches(name, queryset, batch_size=batch_size):
+        chunk = compressor.compress(format_jsonl(batch).encode())
+        if chunk:
+            yield chunk
+    yield compressor.flush()
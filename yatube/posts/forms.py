@@ -1,12 +1,70 @@
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
 
+from . import uploads
 from .models import Comment, Post
 
 
+class PostImageField(forms.ImageField):
+    """ImageField, который не декодирует картинку целиком: формат и
+    размеры берутся из заголовка (posts.uploads)."""
+
+    default_error_messages = {
+        'too_large': 'Файл больше %(limit)s.',
+        'too_many_pixels': ('Картинка %(width)s×%(height)s слишком '
+                            'большая: не больше %(limit)s мегапикселей.'),
+    }
+
+    def to_python(self, data):
+        if isinstance(data, uploads.RejectedUpload):
+            raise ValidationError(
+                self.error_messages['too_large'], code='too_large',
+                params={'limit': filesizeformat(
+                    settings.POST_IMAGE_MAX_UPLOAD_SIZE)})
+        # проверки FileField: имя, пустой файл; без проверки Pillow
+        upload = forms.FileField.to_python(self, data)
+        if upload is None:
+            return None
+        try:
+            fmt, width, height = uploads.read_header(upload)
+        except Exception as exc:
+            raise ValidationError(self.error_messages['invalid_image'],
+                                  code='invalid_image') from exc
+        if fmt not in uploads.SAVE_OPTIONS:
+            raise ValidationError(self.error_messages['invalid_image'],
+                                  code='invalid_image')
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                self.error_messages['too_many_pixels'],
+                code='too_many_pixels',
+                params={'width': width, 'height': height,
+                        'limit': settings.POST_IMAGE_MAX_PIXELS // 10**6})
+        upload.content_type = Image.MIME[fmt]
+        return upload
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {'image': PostImageField}
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # новая загрузка; сохраненная картинка поста приходит как FieldFile
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            return uploads.normalize(image)
+        except Exception as exc:
+            # заголовок верный, а пиксели битые
+            raise ValidationError(
+                self.fields['image'].error_messages['invalid_image'],
+                code='invalid_image') from exc
 
 
 class CommentForm(forms.ModelForm):
@@ -0,0 +1,71 @@
+"""Справочник групп: slug, название, описание, число постов и время
+последнего поста каждой группы.
+
+Справочник собирается одним запросом и лежит в общем кеше под ключом с
+версией (posts.cache.groups_version), а каждый процесс держит свою
+копию. Сигналы Group и Post поднимают версию; увидев новую версию,
+процесс берет справочник из общего кеша, а если его там нет —
+пересобирает (пересобирает один, остальные ждут: get_or_compute).
+Поиск группы по slug, каталог групп и список популярных групп
+обходятся без запросов к базе.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import Http404
+
+from core.cache import get_or_compute
+
+from .cache import groups_version
+from .models import Group
+
+GroupInfo = namedtuple('GroupInfo', ('id', 'slug', 'title', 'description',
+                                     'post_count', 'last_activity'))
+
+
+class Registry:
+    def __init__(self, version, groups):
+        self.version = version
+        self.groups = groups
+        self.by_slug = {group.slug: group for group in groups}
+        self.popular = sorted(
+            (group for group in groups if group.post_count),
+            key=lambda group: (-group.post_count, group.title))
+
+
+# копия справочника в процессе
+_local = {}
+
+
+def load():
+    """Все группы по названию, с числом постов и последним постом."""
+    rows = (Group.objects
+            .annotate(post_count=Count('post'),
+                      last_activity=Max('post__pub_date'))
+            .order_by('title', 'pk')
+            .values_list(*GroupInfo._fields))
+    return [GroupInfo(*row) for row in rows]
+
+
+def registry():
+    """Справочник текущей версии: копия процесса, общий кеш или база."""
+    version = groups_version()
+    current = _local.get('registry')
+    if current is not None and current.version == version:
+        return current
+    _local['registry'] = Registry(version, get_or_compute(
+        f'groups:registry:{version}', load, settings.GROUP_REGISTRY_TIMEOUT))
+    return _local['registry']
+
+
+def get_group(slug):
+    """GroupInfo по slug или Http404."""
+    group = registry().by_slug.get(slug)
+    if group is None:
+        raise Http404('Группа не найдена')
+    return group
+
+
+def popular_groups(limit=None):
+    return registry().popular[:limit or settings.POPULAR_GROUPS_LIMIT]
@@ -0,0 +1,149 @@
+"""Адаптивные копии картинок постов для srcset.
+
+Картинка поста режется под пропорции POST_THUMBNAIL_GEOMETRY в
+несколько ширин POST_IMAGE_WIDTHS и сохраняется в WebP, в AVIF, если
+Pillow его умеет (Pillow 11+ или плагин pillow-avif-plugin), и в JPEG
+для браузеров без них. Копии делает воркер очереди
+(posts.tasks.generate_image_variants), шаблон выводит их через
+<picture> и srcset (posts.templatetags.post_images).
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from .cache import bump_feed_generation
+from .models import Post, PostImageVariant
+
+try:
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+MIME_TYPES = {
+    PostImageVariant.AVIF: 'image/avif',
+    PostImageVariant.WEBP: 'image/webp',
+    PostImageVariant.JPEG: 'image/jpeg',
+}
+SAVE_OPTIONS = {
+    PostImageVariant.AVIF: {'format': 'AVIF', 'quality': 50},
+    PostImageVariant.WEBP: {'format': 'WEBP', 'quality': 75, 'method': 4},
+    PostImageVariant.JPEG: {'format': 'JPEG', 'quality': 80,
+                            'optimize': True, 'progressive': True},
+}
+
+
+def available_formats():
+    """Форматы, которые умеет сохранять установленный Pillow."""
+    formats = [PostImageVariant.JPEG]
+    if features.check('webp'):
+        formats.append(PostImageVariant.WEBP)
+    Image.init()
+    if 'AVIF' in Image.SAVE:
+        formats.append(PostImageVariant.AVIF)
+    return formats
+
+
+def aspect_ratio():
+    width, height = settings.POST_THUMBNAIL_GEOMETRY.split('x')
+    return int(height) / int(width)
+
+
+def variant_widths(source_width):
+    """Ширины не больше исходной, но хотя бы одна."""
+    widths = sorted(settings.POST_IMAGE_WIDTHS)
+    return [width for width in widths if width <= source_width] or widths[:1]
+
+
+def encode(image, fmt):
+    if fmt == PostImageVariant.JPEG and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A')
+                         if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, **SAVE_OPTIONS[fmt])
+    return buffer.getvalue()
+
+
+def variant_name(post_id, source, width, fmt):
+    # имя зависит от исходной картинки: новая картинка — новые адреса
+    digest = hashlib.md5(source.encode()).hexdigest()[:10]
+    return f'posts/variants/{post_id}/{digest}-{width}.{fmt}'
+
+
+def render_variants(post_id, source, data, formats=None):
+    """Сохраняет копии картинки data; возвращает несохраненные строки
+    PostImageVariant."""
+    with Image.open(io.BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original)
+        original = original.convert(
+            'RGBA' if 'A' in original.getbands()
+            or 'transparency' in original.info else 'RGB')
+        ratio = aspect_ratio()
+        variants = []
+        for width in variant_widths(original.width):
+            height = max(1, round(width * ratio))
+            resized = ImageOps.fit(original, (width, height), Image.LANCZOS)
+            for fmt in formats or available_formats():
+                content = encode(resized, fmt)
+                name = default_storage.save(
+                    variant_name(post_id, source, width, fmt),
+                    ContentFile(content))
+                variants.append(PostImageVariant(
+                    post_id=post_id, source=source, format=fmt, width=width,
+                    name=name, size=len(content), source_size=len(data)))
+    return variants
+
+
+def generate(post_id):
+    """Делает копии картинки поста и заменяет ими старые."""
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return []
+    source = post.image.name
+    with post.image.open('rb') as file:
+        data = file.read()
+    variants = render_variants(post_id, source, data)
+    with transaction.atomic():
+        # картинку могли заменить, пока делались копии
+        replaced = not Post.objects.filter(pk=post_id, image=source).update(
+            updated_at=timezone.now())
+        if not replaced:
+            old = PostImageVariant.objects.filter(post_id=post_id)
+            stale = list(old.values_list('name', flat=True))
+            old.delete()
+            PostImageVariant.objects.bulk_create(variants)
+    if replaced:
+        stale, variants = [variant.name for variant in variants], []
+    current = {variant.name for variant in variants}
+    for name in stale:
+        if name not in current:
+            default_storage.delete(name)
+    if variants:
+        bump_feed_generation()
+    return variants
+
+
+def picture(post, variants):
+    """Источники <picture> по форматам: [(mime, srcset)], сначала
+    самые экономные; JPEG идет в srcset самого <img>."""
+    srcsets = {}
+    for variant in sorted(variants, key=lambda variant: variant.width):
+        if variant.source != post.image.name:
+            continue
+        srcsets.setdefault(variant.format, []).append(
+            f'{default_storage.url(variant.name)} {variant.width}w')
+    sources = [(MIME_TYPES[fmt], ', '.join(srcsets[fmt]))
+               for fmt in (PostImageVariant.AVIF, PostImageVariant.WEBP)
+               if fmt in srcsets]
+    return {
+        'sources': sources,
+        'srcset': ', '.join(srcsets.get(PostImageVariant.JPEG, ())),
+        'sizes': settings.POST_IMAGE_SIZES,
+    }
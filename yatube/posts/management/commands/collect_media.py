@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import blobs
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из media картинки постов без ссылок, копии для srcset '
+            'удаленных постов и ненужные миниатюры sorl-thumbnail.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=None,
+                            help='Не трогать файлы моложе стольких секунд '
+                                 '(по умолчанию MEDIA_GC_GRACE).')
+        parser.add_argument('--recount', action='store_true',
+                            help='Сначала пересчитать ссылки на картинки.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, ничего не удалять.')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            blobs.rebuild()
+        removed = blobs.collect(options['grace'], options['dry_run'])
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} картинок: {removed["images"]}, '
+            f'копий: {removed["variants"]}, '
+            f'миниатюр: {removed["thumbnails"]}'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты, комментарии или подписки в JSONL '
+            'или CSV (.gz — со сжатием) с контрольной точкой для '
+            'продолжения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(export.EXPORTS))
+        parser.add_argument('output', help='Файл: .jsonl, .csv, можно .gz')
+        parser.add_argument('--format', choices=sorted(export.FORMATS),
+                            help='Формат, если его не видно по имени файла.')
+        parser.add_argument('--batch-size', type=int,
+                            default=export.BATCH_SIZE)
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с контрольной точки <output>.checkpoint; '
+                 'после завершенной выгрузки допишет только новые строки.')
+
+    def handle(self, *args, **options):
+        try:
+            rows = export.export(options['model'], options['output'],
+                                 fmt=options['format'],
+                                 batch_size=options['batch_size'],
+                                 resume=options['resume'])
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено записей: {rows}'))
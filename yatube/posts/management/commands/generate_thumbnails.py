@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры постов, у которых их еще нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать миниатюры всех постов')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(thumbnail='')
+        done = 0
+        for post_id in posts.values_list('pk', flat=True).iterator():
+            if thumbnails.generate(post_id):
+                done += 1
+        self.stdout.write(self.style.SUCCESS(f'Готово миниатюр: {done}'))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import dataset
+
+
+class Command(BaseCommand):
+    help = ('Массово загружает пользователей, группы, посты, комментарии '
+            'и подписки из JSONL/CSV (можно .gz) или генерирует '
+            'синтетические данные для нагрузочных тестов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources', nargs='*',
+            help='Файлы JSONL с полем type в каждой записи или CSV '
+                 'с записями одного типа (см. --type).')
+        parser.add_argument(
+            '--type', choices=dataset.RECORD_TYPES,
+            help='Тип записей в CSV-файлах.')
+        parser.add_argument('--users', type=int, default=0)
+        parser.add_argument('--groups', type=int, default=0)
+        parser.add_argument('--posts', type=int, default=0)
+        parser.add_argument('--comments', type=int, default=0)
+        parser.add_argument('--follows', type=int, default=0)
+        parser.add_argument('--prefix', default='load',
+                            help='Префикс имен сгенерированных объектов.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int,
+                            default=dataset.BATCH_SIZE)
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счетчики, ленты и поисковый индекс.')
+
+    def handle(self, *args, **options):
+        sources = options['sources']
+        batch_size = options['batch_size']
+        sizes = {name: options[name] for name in
+                 ('users', 'groups', 'posts', 'comments', 'follows')}
+        if not sources and not any(sizes.values()):
+            raise CommandError('Укажите файлы для загрузки или размеры '
+                               'генерируемых данных.')
+        if sources:
+            for path in sources:
+                self._load_file(path, options['type'], batch_size)
+        if any(sizes.values()):
+            if sizes['posts'] and not sizes['users']:
+                raise CommandError('Для генерации постов нужны --users.')
+            dataset.generate(prefix=options['prefix'], seed=options['seed'],
+                             batch_size=batch_size, **sizes)
+            self.stdout.write(f'Сгенерировано: {sizes}')
+        if not options['skip_derived']:
+            dataset.rebuild_derived()
+        self.stdout.write(self.style.SUCCESS('Данные загружены'))
+
+    def _load_file(self, path, record_type, batch_size):
+        is_csv = path.endswith(('.csv', '.csv.gz'))
+        if is_csv and not record_type:
+            raise CommandError('Для CSV-файлов нужен --type.')
+        try:
+            with dataset.open_text(path) as file:
+                if is_csv:
+                    records = dataset.read_csv(file, record_type)
+                else:
+                    records = dataset.read_jsonl(file)
+                loaded = dataset.load(records, batch_size)
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'{path}: {error!r}')
+        self.stdout.write(f'{path}: {loaded}')
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    # как posts.timeline.rebuild: последние посты каждого автора
+    # читаются один раз и раскладываются всем его подписчикам пачками
+    db = schema_editor.connection.alias
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    entries = TimelineEntry.objects.using(db)
+    follows = (Follow.objects.using(db).order_by('author_id')
+               .values_list('author_id', 'user_id'))
+    batch = []
+    author_id, posts = None, []
+    for follow_author_id, user_id in follows.iterator():
+        if follow_author_id != author_id:
+            author_id = follow_author_id
+            posts = list(Post.objects.using(db).filter(author_id=author_id)
+                         .order_by('-pub_date', '-id')
+                         .values_list('id', 'pub_date')
+                         [:settings.TIMELINE_BACKFILL])
+        batch += [TimelineEntry(user_id=user_id,
+                                post_id=post_id,
+                                author_id=author_id,
+                                pub_date=pub_date)
+                  for post_id, pub_date in posts]
+        if len(batch) >= 500:
+            entries.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    entries.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_auto_20230316_0920'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
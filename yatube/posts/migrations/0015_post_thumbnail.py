@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail',
+            field=models.CharField(blank=True, editable=False, help_text='Адрес готовой миниатюры', max_length=255, verbose_name='Миниатюра'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.19 on 2026-10-18 18:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled(apps, schema_editor):
+    # авторы выше предела и раньше не раскладывались по лентам
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.using(schema_editor.connection.alias).filter(
+        follower_count__gt=getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000),
+    ).update(timeline_pull=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_media_blob'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_date_idx',
+        ),
+        migrations.AddField(
+            model_name='authorstats',
+            name='timeline_pull',
+            field=models.BooleanField(
+                default=False, verbose_name='Посты подтягиваются в ленты'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'],
+                               name='timeline_user_date_idx'),
+        ),
+    ]
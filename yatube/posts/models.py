@@ -1,6 +1,9 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -14,11 +17,30 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    # Поля, которые выводит карточка поста в лентах
+    FEED_FIELDS = ('id', 'text', 'pub_date', 'updated_at', 'image',
+                   'thumbnail', 'comment_count',
+                   'author__id', 'author__username',
+                   'author__first_name', 'author__last_name',
+                   'group__id', 'group__slug', 'group__title')
+
+    def for_feed(self):
+        """Посты для лент: автор и группа одним JOIN, без лишних полей."""
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+    def for_detail(self):
+        """Пост для post_detail вместе со счетчиками автора."""
+        return self.select_related('author', 'author__stats', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст поста',
                             help_text='Введите текст поста',)
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='Дата изменения')
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
                                related_name='post',
@@ -34,16 +56,50 @@ class Post(models.Model):
                               )
     image = models.ImageField(verbose_name='Картинка',
                               upload_to='posts/',
+                              storage=ContentAddressedStorage(),
                               blank=True,
                               )
+    thumbnail = models.CharField(max_length=255,
+                                 blank=True,
+                                 editable=False,
+                                 verbose_name='Миниатюра',
+                                 help_text='Адрес готовой миниатюры',
+                                 )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число комментариев',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        # Индексы повторяют сортировку лент (-pub_date, -id),
+        # чтобы курсорная пагинация читала индекс без сортировки.
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:settings.TEXT_LIMIT]
 
 
+class CommentQuerySet(models.QuerySet):
+    def for_post(self, post):
+        """Комментарии поста с авторами одним запросом."""
+        return (self.filter(post=post)
+                .select_related('author')
+                .only('id', 'text', 'created', 'post_id', 'author__id',
+                      'author__username')
+                .order_by('created', 'id'))
+
+
 class Comment(models.Model):
 
     text = models.TextField(verbose_name='Текст коментария',
@@ -53,6 +109,9 @@ class Comment(models.Model):
     created = models.DateTimeField(auto_now_add=True,
                                    verbose_name='Дата публикации коментария',
                                    )
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='Дата изменения',
+                                      )
     post = models.ForeignKey(Post,
                              on_delete=models.CASCADE,
                              verbose_name='Пост',
@@ -66,6 +125,14 @@ class Comment(models.Model):
                                verbose_name='Автор коменария',
                                )
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return self.author.username
 
@@ -93,3 +160,192 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'Пользователь {self.user} подписался на {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+    Заполняется при публикации поста (fan-out on write),
+    см. posts.timeline.
+    """
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Читатель',
+                             )
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries',
+                             verbose_name='Пост',
+                             )
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+',
+                               verbose_name='Автор',
+                               )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} в ленте {self.user_id}'
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счетчики пользователя.
+    Обновляются атомарно через F() (posts.counters), пересчитываются
+    командой rebuild_counters.
+    """
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='stats',
+                                verbose_name='Пользователь',
+                                )
+    post_count = models.PositiveIntegerField(default=0,
+                                             verbose_name='Постов')
+    follower_count = models.PositiveIntegerField(default=0,
+                                                 verbose_name='Подписчиков')
+    following_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписок')
+    # посты не раскладываются по лентам, а подтягиваются при чтении
+    # (posts.timeline); снимается, когда раскладка догонит ленты
+    timeline_pull = models.BooleanField(
+        default=False, verbose_name='Посты подтягиваются в ленты')
+
+    def __str__(self):
+        return f'Счетчики {self.user_id}'
+
+
+class SearchEntry(models.Model):
+    """Строка обратного индекса: основа слова -> пост.
+    weight — сколько раз основа встречается в тексте поста.
+    """
+    term = models.CharField(max_length=64, verbose_name='Основа слова')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='search_entries',
+                             verbose_name='Пост',
+                             )
+    weight = models.PositiveIntegerField(default=1, verbose_name='Вес')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'], name='unique_search_entry')
+        ]
+
+    def __str__(self):
+        return f'{self.term} -> {self.post_id}'
+
+
+class ChangeLog(models.Model):
+    """Журнал изменений постов и комментариев, только для добавления.
+    Пишется сигналами, читается потребителями по возрастанию id
+    (см. posts.changes).
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTIONS = (
+        (CREATE, 'Создание'),
+        (UPDATE, 'Изменение'),
+        (DELETE, 'Удаление'),
+    )
+
+    model = models.CharField(max_length=20, verbose_name='Модель')
+    object_id = models.PositiveIntegerField(verbose_name='Id объекта')
+    action = models.CharField(max_length=10,
+                              choices=ACTIONS,
+                              verbose_name='Действие',
+                              )
+    changed_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Время изменения')
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['model', 'id'],
+                         name='changelog_model_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.action} {self.model} {self.object_id}'
+
+
+class PostImageVariant(models.Model):
+    """Уменьшенная копия картинки поста одной ширины и формата для
+    srcset. Готовится в фоне (posts.images), size хранит размер файла,
+    source_size — размер исходной картинки, чтобы видеть экономию.
+    """
+    JPEG = 'jpeg'
+    WEBP = 'webp'
+    AVIF = 'avif'
+    FORMATS = (
+        (JPEG, 'JPEG'),
+        (WEBP, 'WebP'),
+        (AVIF, 'AVIF'),
+    )
+
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='image_variants',
+                             verbose_name='Пост',
+                             )
+    source = models.CharField(max_length=255,
+                              verbose_name='Исходная картинка')
+    format = models.CharField(max_length=4,
+                              choices=FORMATS,
+                              verbose_name='Формат',
+                              )
+    width = models.PositiveSmallIntegerField(verbose_name='Ширина')
+    name = models.CharField(max_length=255, verbose_name='Файл')
+    size = models.PositiveIntegerField(verbose_name='Размер, байт')
+    source_size = models.PositiveIntegerField(
+        verbose_name='Размер исходной картинки, байт')
+
+    class Meta:
+        ordering = ['post', 'format', 'width']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'format', 'width'],
+                                    name='unique_post_image_variant'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} {self.format} {self.width}w'
+
+
+class MediaBlob(models.Model):
+    """Файл картинки в хранилище posts.storage и число постов, которые
+    на него ссылаются. Счетчик ведут сигналы (posts.blobs), файлы без
+    ссылок удаляет manage.py collect_media.
+    """
+    name = models.CharField(max_length=255,
+                            unique=True,
+                            verbose_name='Файл')
+    size = models.PositiveIntegerField(default=0,
+                                       verbose_name='Размер, байт')
+    refcount = models.IntegerField(default=0, verbose_name='Ссылок')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Создан')
+    updated = models.DateTimeField(default=timezone.now,
+                                   verbose_name='Изменен счетчик')
+
+    class Meta:
+        ordering = ['name']
+        indexes = [
+            models.Index(fields=['refcount', 'updated'],
+                         name='mediablob_refcount_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
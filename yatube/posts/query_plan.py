@@ -0,0 +1,40 @@
+"""Проверка планов запросов лент через EXPLAIN QUERY PLAN (SQLite).
+
+Запрос ленты должен читать таблицы по индексу. Полный просмотр
+таблицы (SCAN без индекса) или сортировка во временном B-дереве
+(USE TEMP B-TREE) означают, что время запроса растет вместе с
+таблицей, даже если страница ограничена LIMIT.
+"""
+import re
+
+from django.db import connection
+
+TEMP_BTREE = 'USE TEMP B-TREE'
+
+
+def explain(queryset):
+    """Строки плана запроса без служебных номеров узлов."""
+    lines = queryset.explain().splitlines()
+    return [re.sub(r'^[\d\s]+', '', line) for line in lines]
+
+
+def plan_problems(plan):
+    """Строки плана с полным просмотром таблицы или временной сортировкой.
+    """
+    return [line for line in plan
+            if line.startswith('SCAN') and ' USING ' not in line
+            or TEMP_BTREE in line]
+
+
+class QueryPlanMixin:
+    """Добавляет в TestCase проверку плана запроса."""
+
+    def assert_indexed_plan(self, queryset, msg=None):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Формат плана разобран только для SQLite')
+        plan = explain(queryset)
+        problems = plan_problems(plan)
+        if problems:
+            self.fail(self._formatMessage(
+                msg, 'План запроса без индекса: {}\n{}\n{}'.format(
+                    problems, '\n'.join(plan), queryset.query)))
@@ -0,0 +1,190 @@
+"""Полнотекстовый поиск по постам на обратном индексе.
+
+Текст поста разбивается на слова, слова приводятся к основе
+стеммером Snowball для русского языка и складываются в SearchEntry.
+Поиск читает только строки индекса с нужными основами, поэтому не
+зависит от размера таблицы постов. Индекс обновляется сигналами
+при сохранении поста, при удалении строки уходят каскадом.
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+
+from .models import Post, SearchEntry
+
+WORD_RE = re.compile(r'[0-9a-zа-яё]+')
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 10
+
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'был', 'была', 'были', 'было', 'быть', 'в', 'вам',
+    'вас', 'вот', 'все', 'всё', 'вы', 'где', 'да', 'для', 'до', 'его',
+    'ее', 'её', 'ей', 'если', 'есть', 'еще', 'ещё', 'же', 'за', 'и', 'из',
+    'или', 'им', 'их', 'к', 'как', 'когда', 'кто', 'ли', 'мне', 'мы',
+    'на', 'над', 'не', 'нет', 'ни', 'но', 'о', 'об', 'он', 'она', 'они',
+    'оно', 'от', 'по', 'под', 'при', 'про', 'с', 'со', 'так', 'там',
+    'то', 'тот', 'ты', 'у', 'уже', 'что', 'чтобы', 'это', 'эта', 'эти',
+    'этот', 'я',
+))
+
+VOWELS = 'аеиоуыэюя'
+
+
+def _endings(plain=(), guarded=()):
+    """Окончания по убыванию длины; guarded требуют перед собой а/я."""
+    endings = [(ending, False) for ending in plain]
+    endings += [(ending, True) for ending in guarded]
+    return sorted(endings, key=lambda item: len(item[0]), reverse=True)
+
+
+PERFECTIVE_GERUND = _endings(
+    plain=('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+    guarded=('в', 'вши', 'вшись'))
+ADJECTIVE = _endings(plain=(
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею'))
+PARTICIPLE = _endings(plain=('ивш', 'ывш', 'ующ'),
+                      guarded=('ем', 'нн', 'вш', 'ющ', 'щ'))
+REFLEXIVE = _endings(plain=('ся', 'сь'))
+VERB = _endings(
+    plain=('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+           'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+           'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+    guarded=('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло',
+             'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'))
+NOUN = _endings(plain=(
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я'))
+DERIVATIONAL = _endings(plain=('ост', 'ость'))
+SUPERLATIVE = _endings(plain=('ейш', 'ейше'))
+
+
+def _regions(word):
+    """Начала областей RV и R2 алгоритма Snowball."""
+    rv = next((i + 1 for i, char in enumerate(word) if char in VOWELS),
+              len(word))
+    r1 = next((i + 1 for i in range(1, len(word))
+               if word[i] not in VOWELS and word[i - 1] in VOWELS),
+              len(word))
+    r2 = next((i + 1 for i in range(r1 + 1, len(word))
+               if word[i] not in VOWELS and word[i - 1] in VOWELS),
+              len(word))
+    return rv, r2
+
+
+def _remove(word, start, endings):
+    """Отрезает самое длинное окончание, целиком лежащее в word[start:].
+    Возвращает None, если подходящего окончания нет.
+    """
+    for ending, guarded in endings:
+        if not word.endswith(ending):
+            continue
+        stem = word[:-len(ending)]
+        if len(stem) < start:
+            return None
+        if guarded and (len(stem) <= start or stem[-1] not in 'ая'):
+            return None
+        return stem
+    return None
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа русского слова по алгоритму Snowball.
+    Результаты кэшируются: при переиндексации слова сильно повторяются.
+    """
+    word = word.replace('ё', 'е')
+    rv, r2 = _regions(word)
+    result = _remove(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = _remove(word, rv, REFLEXIVE) or word
+        result = _remove(word, rv, ADJECTIVE)
+        if result is not None:
+            result = _remove(result, rv, PARTICIPLE) or result
+        else:
+            result = (_remove(word, rv, VERB)
+                      or _remove(word, rv, NOUN)
+                      or word)
+    word = result
+    if word.endswith('и') and len(word) > rv:
+        word = word[:-1]
+    word = _remove(word, r2, DERIVATIONAL) or word
+    superlative = _remove(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+    if word.endswith('нн') and len(word) > rv:
+        return word[:-1]
+    if superlative is None and word.endswith('ь') and len(word) > rv:
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Основы значимых слов текста в порядке появления."""
+    terms = []
+    for word in WORD_RE.findall(text.lower()):
+        if word in STOP_WORDS:
+            continue
+        terms.append(stem(word)[:MAX_TERM_LENGTH])
+    return terms
+
+
+def index_post(post):
+    """Перестраивает строки индекса одного поста."""
+    weights = Counter(tokenize(post.text))
+    with transaction.atomic():
+        SearchEntry.objects.filter(post_id=post.pk).delete()
+        SearchEntry.objects.bulk_create(
+            SearchEntry(term=term, post_id=post.pk, weight=weight)
+            for term, weight in weights.items())
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    """Строит индекс всех постов заново."""
+    SearchEntry.objects.all().delete()
+    entries = []
+    posts = Post.objects.order_by().values_list('pk', 'text')
+    for post_id, text in posts.iterator(chunk_size=batch_size):
+        entries += [SearchEntry(term=term, post_id=post_id, weight=weight)
+                    for term, weight in Counter(tokenize(text)).items()]
+        if len(entries) >= batch_size:
+            SearchEntry.objects.bulk_create(entries)
+            entries = []
+    SearchEntry.objects.bulk_create(entries)
+
+
+def search_posts(query):
+    """Посты, подходящие под запрос, по убыванию релевантности.
+
+    Сначала идут посты, где нашлось больше слов запроса, затем посты
+    с большим весом tf/df: редкие слова весят больше частых.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return Post.objects.none()
+    frequencies = dict(
+        SearchEntry.objects.filter(term__in=terms)
+        .values('term')
+        .annotate(posts=Count('pk'))
+        .values_list('term', 'posts'))
+    if not frequencies:
+        return Post.objects.none()
+    idf = Case(
+        *[When(search_entries__term=term, then=Value(1.0 / posts))
+          for term, posts in frequencies.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    return (Post.objects.for_feed()
+            .filter(search_entries__term__in=list(frequencies))
+            .annotate(matched=Count('search_entries'),
+                      score=Sum(F('search_entries__weight') * idf,
+                                output_field=FloatField()))
+            .order_by('-matched', '-score', '-pub_date', '-id'))
@@ -0,0 +1,212 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import blobs, changes, counters, tasks, timeline
+from .cache import (bump_cards_version, bump_feed_generation,
+                    bump_groups_version)
+from .models import ChangeLog, Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_feeds(sender, **kwargs):
+    bump_feed_generation()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_groups(sender, **kwargs):
+    bump_groups_version()
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_groups(sender, instance, created, raw=False,
+                           **kwargs):
+    # справочник групп (posts.groups) хранит число постов и дату
+    # последнего: правка текста или картинки его не меняет
+    saved = instance.__dict__.pop('_saved_group', None)
+    if created or raw:
+        changed = raw or instance.group_id is not None
+    else:
+        changed = saved is not None and saved != (instance.group_id,
+                                                  instance.pub_date)
+    if changed:
+        bump_groups_version()
+
+
+@receiver(post_delete, sender=Post)
+def release_post_group(sender, instance, **kwargs):
+    if instance.group_id is not None:
+        bump_groups_version()
+
+
+# поля, которые выводятся в карточках постов и на странице поста
+CARD_FIELDS = {
+    User: ('username', 'first_name', 'last_name'),
+    Group: ('title', 'slug'),
+}
+
+
+def _bump_cards():
+    # фрагмент главной собран из карточек, поэтому сбрасываются и ленты
+    bump_cards_version()
+    bump_feed_generation()
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Group)
+def remember_card_fields(sender, instance, raw=False, update_fields=None,
+                         **kwargs):
+    fields = CARD_FIELDS[sender]
+    # вход пользователя сохраняет только last_login
+    if raw or instance._state.adding or (
+            update_fields is not None and not set(fields) & set(
+                update_fields)):
+        return
+    instance._saved_card_fields = sender.objects.filter(
+        pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+def invalidate_cards(sender, instance, created, raw=False, **kwargs):
+    # у нового пользователя или группы постов еще нет; пароль и прочие
+    # поля, которых нет в карточке, версию не меняют
+    saved = instance.__dict__.pop('_saved_card_fields', None)
+    if created:
+        return
+    current = tuple(getattr(instance, field) for field in CARD_FIELDS[sender])
+    if raw or (saved is not None and saved != current):
+        _bump_cards()
+
+
+@receiver(post_delete, sender=Group)
+def release_group_cards(sender, **kwargs):
+    # посты группы отвязываются (SET_NULL) одним UPDATE, без сигналов
+    _bump_cards()
+
+
+# Счетчики подключаются раньше лент: timeline проверяет
+# популярность автора по уже обновленному follower_count.
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(instance.author_id, post_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change(instance.author_id, post_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(instance.author_id, follower_count=1)
+        counters.change(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.change(instance.author_id, follower_count=-1)
+    counters.change(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+
+
+def _image_saved(instance, raw, update_fields):
+    return not raw and (update_fields is None or 'image' in update_fields)
+
+
+def _group_saved(instance, raw, update_fields):
+    return not raw and (update_fields is None
+                        or {'group', 'pub_date'} & set(update_fields))
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_state(sender, instance, raw=False, update_fields=None,
+                         **kwargs):
+    image_saved = _image_saved(instance, raw, update_fields)
+    group_saved = _group_saved(instance, raw, update_fields)
+    if instance._state.adding or not (image_saved or group_saved):
+        return
+    # прежние картинка (убавить ее счетчик после сохранения) и группа с
+    # датой (менять ли справочник групп) одним запросом
+    saved = Post.objects.filter(pk=instance.pk).values_list(
+        'image', 'group_id', 'pub_date').first()
+    if saved is None:
+        return
+    if image_saved:
+        instance._saved_image = saved[0]
+    if group_saved:
+        instance._saved_group = saved[1:]
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, created, raw=False,
+                           update_fields=None, **kwargs):
+    if not _image_saved(instance, raw, update_fields):
+        return
+    previous = instance.__dict__.pop('_saved_image', None)
+    if previous != instance.image.name:
+        blobs.add_reference(instance.image.name)
+        blobs.drop_reference(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    blobs.drop_reference(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+    # автор снова не больше предела: вернуть раскладку по лентам
+    if timeline.should_resume(instance.author_id):
+        tasks.resume_fan_out.delay(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is None or 'text' in update_fields:
+        tasks.index_post.delay(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def log_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        changes.record(instance,
+                       ChangeLog.CREATE if created else ChangeLog.UPDATE)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def log_delete(sender, instance, **kwargs):
+    changes.record(instance, ChangeLog.DELETE)
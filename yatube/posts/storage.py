@@ -0,0 +1,69 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Имя файла — sha256 его байтов, поэтому одна и та же картинка,
+загруженная дважды, лежит на диске один раз, а у разных картинок не
+бывает одинаковых имен. Файлы раскладываются по каталогам из первых
+символов хеша (posts/ab/cd/abcd….jpg): файлы делятся на 65536
+каталогов, и листинг каждого остается коротким.
+
+Файлы никто не перезаписывает: если файл с таким именем уже есть, save
+обновляет время его изменения и возвращает имя. Свежий файл сборщик
+мусора (posts.blobs.collect) не трогает, даже если ссылок на него еще
+нет — пост с ним может как раз сохраняться.
+"""
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# два уровня по два шестнадцатеричных символа: 65536 каталогов
+SHARD_WIDTH = 2
+SHARD_DEPTH = 2
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def shards(digest):
+    return [digest[i:i + SHARD_WIDTH]
+            for i in range(0, SHARD_WIDTH * SHARD_DEPTH, SHARD_WIDTH)]
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, content):
+        """Имя по содержимому в каталоге исходного имени."""
+        _, ext = os.path.splitext(name)
+        digest = content_hash(content)
+        return posixpath.join(posixpath.dirname(name),
+                              *shards(digest), digest + ext.lower())
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        try:
+            return super().save(name, content, max_length)
+        except FileExistsError:
+            os.utime(self.path(name))
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя значит одинаковое содержимое: суффиксы не нужны.
+        # FileExistsError прерывает и запись, если файл успел создать
+        # соседний воркер.
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
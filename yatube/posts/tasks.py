@@ -0,0 +1,35 @@
+"""Фоновые задачи постов (очередь core.tasks)."""
+from core.tasks import task
+
+from . import images, search, thumbnails, timeline
+from .models import Post
+
+
+@task(max_attempts=5)
+def generate_thumbnail(post_id):
+    thumbnails.generate(post_id)
+
+
+@task(max_attempts=5)
+def generate_image_variants(post_id):
+    images.generate(post_id)
+
+
+@task
+def index_post(post_id):
+    post = Post.objects.filter(pk=post_id).only('text').first()
+    # пост могли удалить раньше, чем дошла очередь
+    if post is not None:
+        search.index_post(post)
+
+
+@task
+def resume_fan_out(author_id):
+    timeline.resume_fan_out(author_id)
+
+
+def queue_images(post):
+    """Ставит в очередь миниатюру и копии новой картинки поста."""
+    if post.image and not post.thumbnail:
+        generate_thumbnail.delay(post.pk)
+        generate_image_variants.delay(post.pk)
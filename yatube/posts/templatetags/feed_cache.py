@@ -0,0 +1,58 @@
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from core.cache import get_or_compute
+
+from ..cache import feed_cache_key, feed_cache_timeout
+
+register = template.Library()
+
+PAGE_PARAMS = ('cursor', 'page')
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, feed, vary_on):
+        self.nodelist = nodelist
+        self.feed = feed
+        self.vary_on = vary_on
+
+    def render(self, context):
+        request = context.get('request')
+        vary_on = [request.GET.get(param, '') if request else ''
+                   for param in PAGE_PARAMS]
+        vary_on += [var.resolve(context) for var in self.vary_on]
+        key = feed_cache_key(self.feed.resolve(context), vary_on)
+        value = get_or_compute(
+            key, lambda: self.nodelist.render(context), feed_cache_timeout(),
+            lock_timeout=getattr(settings, 'FEED_CACHE_LOCK_TIMEOUT', 10))
+        return mark_safe(value)
+
+
+@register.tag('feedcache')
+def do_feedcache(parser, token):
+    """Кеширует фрагмент ленты до следующей записи в Post/Group.
+
+    Использование::
+
+        {% load feed_cache %}
+        {% feedcache 'index' [var1 var2 ...] %}
+            .. some expensive processing ..
+        {% endfeedcache %}
+
+    Ключ учитывает тип ленты, параметры ?cursor= и ?page= запроса,
+    дополнительные переменные и поколение лент (posts.cache). Истекший
+    или сброшенный фрагмент пересчитывает один воркер, остальные его
+    ждут (core.cache.get_or_compute).
+    """
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 2:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 1 argument.")
+    return FeedCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        [parser.compile_filter(t) for t in tokens[2:]],
+    )
@@ -0,0 +1,47 @@
+from django import template
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..cache import cards_version, post_card_key, post_card_timeout
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/post_card.html'
+SEPARATOR = '\n<hr>\n'
+
+
+@register.simple_tag
+def post_cards(posts, show_group=True):
+    """Карточки постов страницы из кеша одним get_many.
+
+    Использование::
+
+        {% load post_cards %}
+        {% post_cards page_obj %}
+        {% post_cards page_obj show_group=False %}
+
+    Рендерятся и кладутся в кеш (одним set_many) только карточки,
+    которых нет в кеше: новые или измененные посты. Копии картинок
+    подгружаются одним запросом и тоже только для них. Правка автора
+    или группы поднимает версию карточек (posts.cache.cards_version).
+    """
+    variant = 'group' if show_group else 'plain'
+    version = cards_version()
+    keys = {post_card_key(post, variant, version): post for post in posts}
+    cached = cache.get_many(list(keys))
+    missing = [post for key, post in keys.items()
+               if key not in cached and post.image]
+    prefetch_related_objects(missing, 'image_variants')
+    rendered = {}
+    cards = []
+    for key, post in keys.items():
+        card = cached.get(key)
+        if card is None:
+            card = rendered[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'show_group': show_group})
+        cards.append(card)
+    if rendered:
+        cache.set_many(rendered, post_card_timeout())
+    return mark_safe(SEPARATOR.join(cards))
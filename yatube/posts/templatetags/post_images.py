@@ -0,0 +1,20 @@
+from django import template
+
+from .. import images
+
+register = template.Library()
+
+
+@register.filter
+def picture_sources(post):
+    """Источники и srcset для <picture> картинки поста.
+
+    Использование::
+
+        {% load post_images %}
+        {% with picture=post|picture_sources %} ... {% endwith %}
+
+    Копии берутся из post.image_variants: в лентах их заранее
+    подгружает тег post_cards.
+    """
+    return images.picture(post, post.image_variants.all())
@@ -0,0 +1,60 @@
+import os
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import benchmark
+from ..dataset import generate, rebuild_derived
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+
+
+def env_number(name, default, cast=int):
+    return cast(os.environ.get(name, default))
+
+
+# Размер набора данных задается переменными окружения, например
+# BENCHMARK_POSTS=100000 python manage.py test posts.tests.test_benchmark
+# BENCHMARK_UPDATE=1 перезаписывает базовый файл текущими замерами.
+# Время ответа зависит от машины, поэтому в обычном прогоне сверяется
+# только число запросов, а время — с BENCHMARK_TIMING=1.
+DATASET = {
+    'users': env_number('BENCHMARK_USERS', 40),
+    'groups': env_number('BENCHMARK_GROUPS', 5),
+    'posts': env_number('BENCHMARK_POSTS', 400),
+    'comments': env_number('BENCHMARK_COMMENTS', 800),
+    'follows': env_number('BENCHMARK_FOLLOWS', 200),
+}
+
+
+class RoutesBenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        generate(**DATASET)
+        rebuild_derived()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_routes_do_not_regress(self):
+        """Число запросов (и с BENCHMARK_TIMING время ответа) адресов
+        posts не растет
+        """
+        results = benchmark.run(
+            repeat=env_number('BENCHMARK_REPEAT', 3))
+        self.assertEqual(benchmark.missing_routes(results), [])
+
+        if os.environ.get('BENCHMARK_UPDATE'):
+            benchmark.save_baseline(BASELINE, DATASET, results)
+            return
+        baseline = benchmark.load_baseline(BASELINE)
+        failures = benchmark.compare(
+            results,
+            baseline,
+            tolerance=env_number('BENCHMARK_TOLERANCE', 1.0, float),
+            slack_ms=env_number('BENCHMARK_SLACK_MS', 50.0, float),
+            check_time=(bool(os.environ.get('BENCHMARK_TIMING'))
+                        and baseline.get('dataset') == DATASET),
+        )
+        self.assertFalse(failures, '\n'.join(failures))
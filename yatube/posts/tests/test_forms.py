@@ -8,6 +8,9 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from core.models import Task
+from core.tasks import run_pending
+
 from ..models import Group, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -51,7 +54,8 @@ class PostCreateFormTest(TestCase):
             content=self.image,
             content_type='image/gif')
 
-        self.path_to_file = 'posts/small.gif'
+        # имя файла — sha256 содержимого (posts.storage)
+        self.image_name = r'^posts/../../[0-9a-f]{64}\.gif$'
 
     @classmethod
     def tearDownClass(cls):
@@ -78,13 +82,16 @@ class PostCreateFormTest(TestCase):
         self.assertRedirects(response, post_profile)
 
         self.assertEqual(Post.objects.count(), post_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                group=self.group.pk,
-                text=self.text,
-                image=self.path_to_file,
-            ).exists()
-        )
+        post = Post.objects.get(group=self.group.pk, text=self.text)
+        self.assertRegex(post.image.name, self.image_name)
+        # миниатюру делает воркер очереди, а не запрос
+        self.assertEqual(post.thumbnail, '')
+        self.assertTrue(Task.objects.filter(
+            name='posts.tasks.generate_thumbnail', args=f'[{post.pk}]',
+        ).exists())
+        run_pending()
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
         cache.clear()
 
     def test_edit_post(self):
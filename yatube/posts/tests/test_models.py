@@ -1,7 +1,17 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
 from django.conf import settings
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..admin import export_jsonl
+from ..changes import changes_since
+from ..models import AuthorStats, ChangeLog, Comment, Follow, Group, Post, User
 
 
 class PostModelTest(TestCase):
@@ -31,3 +41,182 @@ class PostModelTest(TestCase):
         post_lenght = len(str(post))
         self.assertEqual(post_lenght, settings.TEXT_LIMIT)
         self.assertEqual(post.text[:settings.TEXT_LIMIT], str(post))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_writes(self):
+        """Счетчики меняются вместе с постами, подписками и комментариями.
+        """
+        post = Post.objects.create(author=self.author, text='пост')
+        Post.objects.create(author=self.author, text='пост 2')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='1')
+        Comment.objects.create(post=post, author=self.reader, text='2')
+
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual(stats.post_count, 2)
+        self.assertEqual(stats.follower_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+
+        Follow.objects.get(user=self.reader, author=self.author).delete()
+        post.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.post_count, 1)
+        self.assertEqual(stats.follower_count, 0)
+
+    def test_rebuild_counters(self):
+        """Команда rebuild_counters исправляет разошедшиеся счетчики.
+        """
+        post = Post.objects.create(author=self.author, text='пост')
+        Comment.objects.create(post=post, author=self.reader, text='1')
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.update(post_count=100, follower_count=100)
+        AuthorStats.objects.filter(user=self.reader).delete()
+        Post.objects.update(comment_count=0)
+
+        call_command('rebuild_counters', stdout=StringIO())
+
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual(stats.post_count, 1)
+        self.assertEqual(stats.follower_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+
+class LoadDataTest(TestCase):
+    def test_load_jsonl(self):
+        """Команда load_data загружает JSONL с заданными датами.
+        """
+        records = [
+            {'type': 'user', 'username': 'loaded'},
+            {'type': 'user', 'username': 'fan'},
+            {'type': 'group', 'title': 'Группа', 'slug': 'loaded-group'},
+            {'type': 'post', 'id': 500, 'author': 'loaded',
+             'group': 'loaded-group', 'text': 'старый пост про котов',
+             'pub_date': '2015-05-01T10:00:00+00:00'},
+            {'type': 'comment', 'post': 500, 'author': 'fan', 'text': 'да'},
+            {'type': 'follow', 'user': 'fan', 'author': 'loaded'},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data.jsonl')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('\n'.join(json.dumps(r) for r in records))
+            call_command('load_data', path, '--batch-size', '2',
+                         stdout=StringIO())
+
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group.slug, 'loaded-group')
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=post.author).follower_count, 1)
+
+    def test_generate(self):
+        """Команда load_data генерирует данные пачками.
+        """
+        call_command('load_data', '--users', '5', '--groups', '2',
+                     '--posts', '30', '--comments', '10', '--follows', '4',
+                     '--batch-size', '7', stdout=StringIO())
+
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 10)
+        self.assertEqual(
+            Post.objects.filter(pub_date__isnull=True).count(), 0)
+
+
+class ChangeLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    def test_change_log(self):
+        """Сохранения и удаления пишутся в журнал и читаются по курсору
+        """
+        post = Post.objects.create(author=self.author, text='пост')
+        post_id = post.id
+        created = post.updated_at
+        _, cursor = changes_since()
+        post.text = 'новый текст'
+        post.save()
+        self.assertGreater(post.updated_at, created)
+        comment = Comment.objects.create(post=post, author=self.author,
+                                         text='1')
+        comment_id = comment.id
+        post.delete()
+
+        rows, next_cursor = changes_since(cursor)
+        self.assertEqual(
+            [(row['model'], row['object_id'], row['action']) for row in rows],
+            [('post', post_id, ChangeLog.UPDATE),
+             ('comment', comment_id, ChangeLog.CREATE),
+             ('comment', comment_id, ChangeLog.DELETE),
+             ('post', post_id, ChangeLog.DELETE)])
+        self.assertEqual(changes_since(next_cursor), ([], next_cursor))
+        rows, _ = changes_since(cursor, model='comment', limit=1)
+        self.assertEqual(rows[0]['action'], ChangeLog.CREATE)
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'пост {i}') for i in range(5))
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_export_resume(self):
+        """Выгрузка продолжается с контрольной точки без повторов
+        """
+        path = os.path.join(self.directory, 'posts.jsonl.gz')
+        call_command('export_data', 'post', path, '--batch-size', '2',
+                     stdout=StringIO())
+        Post.objects.create(author=self.author, text='новый пост')
+        call_command('export_data', 'post', path, '--batch-size', '2',
+                     '--resume', stdout=StringIO())
+
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual([record['id'] for record in records],
+                         list(Post.objects.order_by('id')
+                              .values_list('id', flat=True)))
+        self.assertEqual(records[-1]['text'], 'новый пост')
+        self.assertEqual(records[0]['author'], 'author')
+
+    def test_export_csv(self):
+        """CSV получает заголовок один раз
+        """
+        path = os.path.join(self.directory, 'follows.csv')
+        call_command('export_data', 'follow', path, stdout=StringIO())
+        with open(path, encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['user'], 'reader')
+
+    def test_admin_action(self):
+        """Действие админки отдает выбранные записи потоком gzip JSONL
+        """
+        queryset = Post.objects.filter(text__in=['пост 1', 'пост 3'])
+        response = export_jsonl(None, None, queryset)
+        data = gzip.decompress(b''.join(response.streaming_content))
+        texts = [json.loads(line)['text'] for line in data.splitlines()]
+        self.assertEqual(texts, ['пост 1', 'пост 3'])
@@ -0,0 +1,82 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import AuthorStats, Comment, Follow, Group, Post, User
+from ..query_plan import QueryPlanMixin, plan_problems
+from ..timeline import TimelinePage
+from ..utils import CursorPage, encode_cursor
+
+
+class FeedQueryPlanTest(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост')
+
+    def feed_pages(self, queryset, page_class=CursorPage):
+        """Первая страница ленты и страницы по курсорам в обе стороны."""
+        position = [timezone.now(), self.post.id]
+        return {
+            'first': page_class(queryset, 10),
+            'next': page_class(queryset, 10,
+                               encode_cursor('next', position)),
+            'prev': page_class(queryset, 10,
+                               encode_cursor('prev', position)),
+        }
+
+    def test_plan_problems(self):
+        """Полный просмотр и временная сортировка считаются проблемой.
+        """
+        self.assertEqual(plan_problems([
+            'SCAN posts_post USING INDEX post_date_idx',
+            'SEARCH auth_user USING INTEGER PRIMARY KEY (rowid=?)',
+        ]), [])
+        self.assertEqual(len(plan_problems([
+            'SCAN posts_post',
+            'USE TEMP B-TREE FOR ORDER BY',
+        ])), 2)
+
+    def test_feed_plans(self):
+        """Запросы лент index, group_list и profile идут по индексам.
+        """
+        feeds = {
+            'index': Post.objects.for_feed(),
+            'group_list': Post.objects.for_feed().filter(group=self.group),
+            'profile': Post.objects.for_feed().filter(author=self.user),
+        }
+        for feed, queryset in feeds.items():
+            for name, page in self.feed_pages(queryset).items():
+                with self.subTest(feed=feed, page=name):
+                    self.assert_indexed_plan(page.page_queryset)
+
+    def test_follow_feed_plans(self):
+        """Страницы ленты подписок: ключи из TimelineEntry и из постов
+        подтягиваемого автора, посты страницы по id — по индексам.
+        """
+        reader = User.objects.create_user(username='reader')
+        popular = User.objects.create_user(username='popular')
+        Follow.objects.create(user=reader, author=self.user)
+        Follow.objects.create(user=reader, author=popular)
+        AuthorStats.objects.filter(user=popular).update(timeline_pull=True)
+        for name, page in self.feed_pages(reader, TimelinePage).items():
+            with self.subTest(page=name):
+                querysets = page.key_querysets()
+                self.assertEqual(len(querysets), 2)
+                for queryset in querysets:
+                    self.assert_indexed_plan(queryset)
+                self.assert_indexed_plan(page.posts_queryset([self.post.id]))
+                self.assertEqual(list(page), [self.post] * (name != 'prev'))
+
+    def test_post_detail_plans(self):
+        """Запросы post_detail идут по индексам.
+        """
+        self.assert_indexed_plan(
+            Post.objects.for_detail().filter(id=self.post.id))
+        self.assert_indexed_plan(Comment.objects.for_post(self.post))
@@ -0,0 +1,154 @@
+import io
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core.tasks import run_pending
+
+from ..forms import PostForm
+from ..models import MediaBlob, Post, User
+
+
+def make_jpeg(size, orientation=None):
+    exif = Image.Exif()
+    exif[0x010F] = 'TestCamera'
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class PostImageUploadTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='uploader')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client.force_login(self.user)
+
+    def upload(self, content, name='photo.jpg'):
+        return self.client.post(reverse('posts:post_create'), data={
+            'text': 'пост с картинкой',
+            'image': SimpleUploadedFile(name, content, 'image/jpeg'),
+        })
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_oversized_upload_rejected(self):
+        """Файл больше предела отбрасывается обработчиком загрузки,
+        форма показывает ошибку
+        """
+        response = self.upload(os.urandom(4096))
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 1,0\xa0КБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_dimensions_checked_from_header(self):
+        """Размеры проверяются по заголовку, без декодирования
+        """
+        # от файла остался только заголовок: пикселей нет вовсе
+        header = make_jpeg((2000, 1000))[:1024]
+        form = PostForm({'text': 'текст'}, {
+            'image': SimpleUploadedFile('big.jpg', header)})
+        self.assertFalse(form.is_valid())
+        self.assertIn('2000×1000', form.errors['image'][0])
+
+    @override_settings(POST_IMAGE_MAX_SIDE=50)
+    def test_exif_stripped_and_downscaled(self):
+        """EXIF убирается с учетом поворота, большая картинка
+        уменьшается до POST_IMAGE_MAX_SIDE
+        """
+        # orientation 6: снимок повернут, ширина и высота меняются местами
+        self.upload(make_jpeg((200, 100), orientation=6))
+        post = Post.objects.get()
+        with post.image.open('rb') as file, Image.open(file) as image:
+            self.assertEqual(image.size, (25, 50))
+            self.assertEqual(dict(image.getexif()), {})
+
+    def stored_files(self, path='posts'):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root)
+            for directory, _, names in os.walk(
+                os.path.join(self.media_root, path))
+            for name in names)
+
+    def test_same_image_stored_once(self):
+        """Одинаковые картинки лежат в хранилище одним файлом
+        в каталоге по первым символам хеша, ссылки на него считаются
+        """
+        data = make_jpeg((30, 30))
+        self.upload(data, 'first.jpg')
+        self.upload(data, 'second.jpg')
+        first, second = Post.objects.order_by('pk')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name,
+                         r'^posts/(..)/(..)/\1\2[0-9a-f]{60}\.jpg$')
+        self.assertEqual(self.stored_files(), [first.image.name])
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': first.pk}),
+            data={'text': 'новая картинка', 'image': SimpleUploadedFile(
+                'other.jpg', make_jpeg((40, 40)), 'image/jpeg')})
+        first.refresh_from_db()
+        self.assertEqual(MediaBlob.objects.get(name=second.image.name)
+                         .refcount, 1)
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name)
+                         .refcount, 1)
+        second.delete()
+        self.assertEqual(MediaBlob.objects.get(name=second.image.name)
+                         .refcount, 0)
+
+    def test_collect_media(self):
+        """collect_media удаляет картинки, копии и миниатюры без ссылок
+        и оставляет те, на которые ссылаются посты
+        """
+        self.upload(make_jpeg((30, 30)), 'kept.jpg')
+        self.upload(make_jpeg((50, 50)), 'deleted.jpg')
+        kept, deleted = Post.objects.order_by('pk')
+        run_pending()
+        deleted.delete()
+        default_storage.save('posts/ff/ff/ffff.jpg', ContentFile(b'x'))
+        self.assertEqual(len(self.stored_files('cache')), 2)
+
+        out = StringIO()
+        call_command('collect_media', stdout=out)
+        self.assertIn('Удалено картинок: 0, копий: 0, миниатюр: 0',
+                      out.getvalue())
+
+        call_command('collect_media', '--grace=0', stdout=out)
+        kept.refresh_from_db()
+        self.assertEqual(
+            self.stored_files('posts'),
+            sorted([kept.image.name]
+                   + [variant.name for variant in kept.image_variants.all()]))
+        self.assertEqual(self.stored_files('cache'),
+                         [kept.thumbnail[len(settings.MEDIA_URL):]])
+        self.assertEqual(list(MediaBlob.objects.values_list('name',
+                                                            flat=True)),
+                         [kept.image.name])
+
+        # картинку убрали в post_edit: копии больше не нужны
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': kept.pk}),
+            data={'text': 'без картинки', 'image-clear': 'on'})
+        call_command('collect_media', '--grace=0', stdout=out)
+        self.assertEqual(self.stored_files('posts'), [])
+        self.assertFalse(kept.image_variants.exists())
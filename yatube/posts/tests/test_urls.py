@@ -49,6 +49,7 @@ class StaticURLTest(TestCase):
         status_code_url = {
             '/': HTTPStatus.OK,
             '/unexisting_page/': HTTPStatus.NOT_FOUND,
+            '/group/': HTTPStatus.OK,
             f'/group/{self.group.slug}/': HTTPStatus.OK,
             f'/profile/{self.user.username}/': HTTPStatus.OK,
             f'/posts/{self.post.id}/': HTTPStatus.OK,
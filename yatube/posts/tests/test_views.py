@@ -1,13 +1,25 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 
-from ..models import Follow, Group, Post, User
+from core.tasks import run_pending
+
+from .. import groups, images, search, thumbnails
+from ..cache import (bump_feed_generation, cards_version, feed_generation,
+                     groups_version)
+from ..models import (AuthorStats, Comment, Follow, Group, Post,
+                      PostImageVariant, TimelineEntry, User)
+from ..templatetags import post_cards
+from ..utils import encode_cursor
 
 TEST_POSTS = 13
 
@@ -80,6 +92,7 @@ class PostPageTest(TestCase):
     def setUp(self):
         super().setUp()
         self.guest_client = Client(enforce_csrf_checks=True)
+        cache.clear()
 
     @classmethod
     def tearDownClass(cls):
@@ -92,6 +105,8 @@ class PostPageTest(TestCase):
         templates_namespase = {
             'posts/index.html': reverse('posts:index'),
 
+            'posts/group_index.html': reverse('posts:group_index'),
+
             'posts/group_list.html': reverse(
                 'posts:group_list', kwargs={'slug': self.group.slug}),
 
@@ -161,6 +176,145 @@ class PostPageTest(TestCase):
             self.assertEqual(len(response.context['page_obj']),
                              TEST_POSTS - settings.OUTPUT_LIMIT)
 
+    def test_cursor_paginator(self):
+        """Тест курсорной пагинации: переход вперед и назад по ?cursor=
+        """
+        reverse_name = reverse('posts:index')
+        response = self.authorized_client.get(reverse_name)
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.is_cursor)
+        self.assertFalse(page_obj.has_previous())
+        self.assertTrue(page_obj.has_next())
+        first_ids = [post.id for post in page_obj]
+        self.assertEqual(first_ids[0], self.posts_list[-1].id)
+
+        response = self.authorized_client.get(
+            reverse_name, {'cursor': page_obj.next_cursor})
+        next_page = response.context['page_obj']
+        self.assertEqual(len(next_page), TEST_POSTS - settings.OUTPUT_LIMIT)
+        self.assertFalse(next_page.has_next())
+        self.assertTrue(next_page.has_previous())
+        self.assertEqual(next_page[-1].id, self.posts_list[0].id)
+
+        response = self.authorized_client.get(
+            reverse_name, {'cursor': next_page.previous_cursor})
+        self.assertEqual([post.id for post in response.context['page_obj']],
+                         first_ids)
+
+        # испорченный курсор отдает первую страницу
+        oversized = encode_cursor('next', [timezone.now(), 10**30])
+        for cursor in ('broken', oversized):
+            response = self.authorized_client.get(reverse_name,
+                                                  {'cursor': cursor})
+            self.assertEqual(
+                [post.id for post in response.context['page_obj']],
+                first_ids)
+
+        # посты страницы удалили: пустая страница без ссылок
+        Post.objects.exclude(id__in=first_ids).delete()
+        cursors = {'next': page_obj.next_cursor,
+                   'prev': next_page.previous_cursor}
+        for direction, cursor in cursors.items():
+            if direction == 'prev':
+                Post.objects.all().delete()
+            with self.subTest(direction=direction):
+                response = self.authorized_client.get(reverse_name,
+                                                      {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                empty_page = response.context['page_obj']
+                self.assertEqual(len(empty_page), 0)
+                self.assertFalse(empty_page.has_other_pages())
+                self.assertIsNone(empty_page.next_cursor)
+                self.assertIsNone(empty_page.previous_cursor)
+
+    def test_query_count(self):
+        """ Число запросов на страницу не зависит от числа постов
+        """
+        Follow.objects.create(user=self.user_2, author=self.user)
+        for i in range(3):
+            Comment.objects.create(post=self.posts_list[-1],
+                                   author=self.user_2,
+                                   text=f'comment_{i}')
+        pages = {
+            # сессия, пользователь, страница; группы — из справочника
+            reverse('posts:index'): 3,
+            reverse('posts:group_list',
+                    kwargs={'slug': self.group.slug}): 3,
+            # сессия, пользователь
+            reverse('posts:group_index'): 2,
+            # + ETag по счетчикам, автор, счетчики, подписка
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}): 7,
+            # + ETag, пост с автором и группой, комментарии
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.posts_list[-1].id}): 5,
+            # + подтягиваемые авторы, ключи ленты, посты страницы
+            reverse('posts:follow_index'): 5,
+        }
+        for address, queries in pages.items():
+            with self.subTest(address=address):
+                # прогреваем кеш миниатюр и сбрасываем кеш лент
+                self.folower_client.get(address)
+                bump_feed_generation()
+                with self.assertNumQueries(queries):
+                    self.folower_client.get(address)
+
+    def test_not_modified(self):
+        """ Неизменные страницы отвечают 304 без выборки постов
+        """
+        post = self.posts_list[-1]
+        pages = {
+            # сессия, пользователь
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 2,
+            # + отпечаток страницы
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}): 3,
+            reverse('posts:post_detail', kwargs={'post_id': post.id}): 3,
+        }
+        for address, queries in pages.items():
+            with self.subTest(address=address):
+                # первый ответ ставит CSRF-cookie, она входит в отпечаток
+                self.folower_client.get(address)
+                response = self.folower_client.get(address)
+                self.assertIn('Cookie', response['Vary'])
+                self.assertIn('no-cache', response['Cache-Control'])
+                etag = response['ETag']
+                with self.assertNumQueries(queries):
+                    response = self.folower_client.get(
+                        address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                # другой пользователь видит другую страницу
+                response = self.authorized_client.get(
+                    address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                # время изменения не учитывает посетителя: не отдается
+                self.assertNotIn('Last-Modified', response)
+                response = self.authorized_client.get(
+                    address, HTTP_IF_MODIFIED_SINCE=http_date())
+                self.assertEqual(response.status_code, 200)
+
+        address = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        etag = self.folower_client.get(address)['ETag']
+        Comment.objects.create(post=post, author=self.user_2, text='новый')
+        response = self.folower_client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # имя автора выводится на странице поста
+        etag = response['ETag']
+        author = User.objects.get(pk=post.author_id)
+        author.first_name = 'Переименованный'
+        author.save()
+        response = self.folower_client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Переименованный')
+
+        address = reverse('posts:profile',
+                          kwargs={'username': self.user.username})
+        etag = self.folower_client.get(address)['ETag']
+        Follow.objects.create(user=self.user_2, author=self.user)
+        response = self.folower_client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
     def test_context_post_detail(self):
         """Тест context на post_detail
         """
@@ -176,6 +330,36 @@ class PostPageTest(TestCase):
                              post_text,
                              post_group)
 
+    @override_settings(COMMENTS_PER_PAGE=20)
+    def test_lazy_comments(self):
+        """ На странице поста только новые комментарии и их общее число,
+        остальные приходят фрагментом по курсору
+        """
+        post = self.posts_list[0]
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user_2, text=f'comment_{i}')
+            for i in range(25))
+        Post.objects.filter(pk=post.pk).update(comment_count=25)
+
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        comments = response.context['comments']
+        self.assertEqual([c.text for c in comments],
+                         [f'comment_{i}' for i in range(24, 4, -1)])
+        self.assertContains(response, 'Комментарии: 25')
+
+        response = self.authorized_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': post.id}),
+            {'cursor': comments.next_cursor})
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertEqual([c.text for c in response.context['comments']],
+                         [f'comment_{i}' for i in range(4, -1, -1)])
+        self.assertNotContains(response, 'data-comments-more')
+
+        response = self.authorized_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 10**6}))
+        self.assertEqual(response.status_code, 404)
+
     def test_context_post_edit(self):
         """ Тест context post edit
         """
@@ -226,6 +410,56 @@ class PostPageTest(TestCase):
         response = self.authorized_client.get(reverse_name)
         self.assertContains(response, '<img')
 
+    def test_thumbnail_placeholder(self):
+        """ До готовности миниатюры выводится заглушка, затем миниатюра
+        """
+        post = self.posts_list[-1]
+        reverse_name = reverse('posts:post_detail',
+                               kwargs={'post_id': post.id})
+        response = self.authorized_client.get(reverse_name)
+        self.assertContains(response, 'img/placeholder.svg')
+
+        updated_at = Post.objects.get(pk=post.id).updated_at
+        url = thumbnails.generate(post.id)
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail, url)
+        # карточка поста в лентах получает новый ключ кеша
+        self.assertGreater(post.updated_at, updated_at)
+        response = self.authorized_client.get(reverse_name)
+        self.assertContains(response, url)
+        self.assertNotContains(response, 'img/placeholder.svg')
+        # лента сбрасывается и тоже показывает миниатюру
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, url)
+
+    @override_settings(POST_IMAGE_WIDTHS=(1, 2, 640))
+    def test_image_variants(self):
+        """ Копии картинки разной ширины и формата выводятся в srcset
+        """
+        post = self.posts_list[-1]
+        thumbnails.generate(post.id)
+        variants = images.generate(post.id)
+        # исходная картинка 2x1: копий шире ее не делается
+        self.assertEqual({variant.width for variant in variants}, {1, 2})
+        self.assertIn(PostImageVariant.WEBP,
+                      {variant.format for variant in variants})
+        self.assertTrue(all(variant.size and variant.source_size
+                            for variant in variants))
+
+        response = self.authorized_client.get(reverse('posts:index'))
+        webp = [variant for variant in variants
+                if variant.format == PostImageVariant.WEBP]
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, f'{webp[0].name} {webp[0].width}w')
+
+        # новая картинка делает старые копии ненужными
+        old_names = [variant.name for variant in variants]
+        images.generate(post.id)
+        self.assertFalse(any(default_storage.exists(name)
+                             for name in old_names))
+        self.assertEqual(PostImageVariant.objects.filter(post=post).count(),
+                         len(variants))
+
     def test_follow_page_and_paginator(self):
         """ Тест posts:follow_index и paginator
         """
@@ -249,6 +483,88 @@ class PostPageTest(TestCase):
         posts_list = response.context['page_obj']
         self.assertEqual(len(posts_list), 0)
 
+    def test_follow_timeline(self):
+        """ Лента подписок: раскладка при записи, подписка и отписка
+        """
+        Follow.objects.create(user=self.user_2, author=self.user)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user_2).count(),
+            TEST_POSTS)
+        # новый пост автора раскладывается в ленту подписчика
+        post = Post.objects.create(text='fan_out_post', author=self.user)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_2, post=post).exists())
+        response = self.folower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+        # отписка очищает ленту
+        self.folower_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.user.username}))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user_2).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_follow_timeline_popular_author(self):
+        """ Посты популярного автора подтягиваются при чтении
+        """
+        Follow.objects.create(user=self.user_2, author=self.user)
+        post = Post.objects.create(text='popular_post', author=self.user)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user_2).exists())
+        response = self.folower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+        self.assertEqual(len(response.context['page_obj']),
+                         settings.OUTPUT_LIMIT)
+
+    def follow_feed(self, client):
+        """Все посты ленты подписок, по страницам курсора."""
+        posts, cursor = [], None
+        while True:
+            page = client.get(reverse('posts:follow_index'),
+                              {'cursor': cursor} if cursor else {}
+                              ).context['page_obj']
+            posts += list(page)
+            cursor = page.next_cursor
+            if cursor is None:
+                return posts
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_timeline_mixed_pages(self):
+        """ Лента из разложенных и подтягиваемых постов листается
+        курсором без пропусков и повторов
+        """
+        Follow.objects.create(user=self.user_2, author=self.user)
+        Follow.objects.create(user=self.user_2, author=self.user_no_f)
+        Post.objects.create(text='own_post', author=self.user_no_f)
+        # у self.user второй подписчик: его посты больше не раскладываются
+        Follow.objects.create(user=self.user_no_f, author=self.user)
+        Post.objects.create(text='popular_post', author=self.user)
+        expected = list(Post.objects.filter(
+            author__in=[self.user, self.user_no_f]
+        ).order_by('-pub_date', '-id'))
+        self.assertEqual(self.follow_feed(self.folower_client), expected)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_timeline_resumed_fan_out(self):
+        """ Посты, написанные, пока автор был популярным, остаются в
+        ленте, когда подписчиков снова не больше предела
+        """
+        Follow.objects.create(user=self.user_2, author=self.user)
+        Follow.objects.create(user=self.user_no_f, author=self.user)
+        post = Post.objects.create(text='popular_post', author=self.user)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+
+        self.user_no_f_cl.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.user.username}))
+        run_pending()
+        self.assertFalse(AuthorStats.objects.get(
+            user=self.user).timeline_pull)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_2, post=post).exists())
+        self.assertEqual(self.follow_feed(self.folower_client)[0], post)
+
     def test_follow(self):
         """Тестирование подписки
         """
@@ -283,9 +599,9 @@ class PostPageTest(TestCase):
         reverse_name = reverse('posts:index')
         response = self.authorized_client.get(reverse_name)
         posts = response.content
-        # удаление из бд последнего поста
-        Post.objects.order_by('-pk')[0].delete()
-        # проверка № последнего поста и подсчет списка постов созданных вначале
+        # изменение в обход сигналов не сбрасывает кеш
+        Post.objects.filter(pk=self.posts_list[-1].pk).update(
+            text='changed_without_signals')
         old_response = self.authorized_client.get(reverse_name)
         old_posts = old_response.content
         # проверка на совпадение
@@ -298,6 +614,115 @@ class PostPageTest(TestCase):
         # проверка на несовпадение
         self.assertNotEqual(old_posts, new_posts)
 
+    def test_cache_invalidation(self):
+        """ Кеш index учитывает страницу и сбрасывается при записи
+        """
+        reverse_name = reverse('posts:index')
+        first_page = self.authorized_client.get(reverse_name)
+        second_page = self.authorized_client.get(
+            reverse_name,
+            {'cursor': first_page.context['page_obj'].next_cursor})
+        self.assertNotEqual(first_page.content, second_page.content)
+        self.assertNotContains(second_page, self.posts_list[-1].text)
+
+        # удаление поста сразу видно на главной
+        deleted = self.posts_list[-1]
+        self.assertContains(first_page, deleted.text)
+        Post.objects.get(pk=deleted.pk).delete()
+        response = self.authorized_client.get(reverse_name)
+        self.assertNotContains(response, deleted.text)
+
+        # новая группа тоже сбрасывает поколение
+        generation = feed_generation()
+        Group.objects.create(title='new', slug='new', description='new')
+        self.assertNotEqual(feed_generation(), generation)
+
+    def test_group_registry(self):
+        """ Каталог и популярные группы берутся из справочника,
+        справочник пересобирается после записи в Group и Post
+        """
+        response = self.guest_client.get(reverse('posts:group_index'))
+        self.assertEqual(
+            [(group.slug, group.post_count)
+             for group in response.context['groups']],
+            [(self.group.slug, TEST_POSTS), (self.group_2.slug, 0)])
+        self.assertEqual(response.context['groups'][0].last_activity,
+                         self.posts_list[-1].pub_date)
+
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Популярные группы')
+        self.assertContains(
+            response, reverse('posts:group_list', args=[self.group.slug]))
+        self.assertNotContains(
+            response, reverse('posts:group_list', args=[self.group_2.slug]))
+
+        # без записей справочник не запрашивает базу
+        with self.assertNumQueries(0):
+            self.assertEqual(groups.get_group(self.group.slug).id,
+                             self.group.id)
+
+        Group.objects.create(title='new', slug='new', description='new')
+        Post.objects.create(text='пост в новой группе', author=self.user,
+                            group=Group.objects.get(slug='new'))
+        self.assertEqual(groups.get_group('new').post_count, 1)
+        response = self.guest_client.get(
+            reverse('posts:group_list', args=['new']))
+        self.assertContains(response, 'пост в новой группе')
+
+        # правка текста справочник не меняет, перенос в группу — меняет
+        post = Post.objects.get(text='пост в новой группе')
+        version = groups_version()
+        post.text = 'новый текст'
+        post.save()
+        self.assertEqual(groups_version(), version)
+        post.group = self.group_2
+        post.save()
+        self.assertNotEqual(groups_version(), version)
+        self.assertEqual(groups.get_group(self.group_2.slug).post_count, 1)
+        response = self.guest_client.get(
+            reverse('posts:group_list', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_post_cards(self):
+        """ Карточки берутся из кеша одним get_many, после правки
+        перерисовывается только карточка измененного поста
+        """
+        reverse_name = reverse('posts:profile', args=['testuser'])
+        self.authorized_client.get(reverse_name)
+        patch_get_many = mock.patch.object(cache, 'get_many',
+                                           wraps=cache.get_many)
+        patch_render = mock.patch.object(post_cards, 'render_to_string',
+                                         wraps=post_cards.render_to_string)
+        with patch_get_many as get_many, patch_render as render:
+            self.authorized_client.get(reverse_name)
+            self.assertEqual(get_many.call_count, 1)
+            self.assertEqual(render.call_count, 0)
+
+            post = Post.objects.get(pk=self.posts_list[-1].pk)
+            post.text = 'измененный текст'
+            post.save()
+            response = self.authorized_client.get(reverse_name)
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(render.call_args[0][1]['post'].pk, post.pk)
+        self.assertContains(response, 'измененный текст')
+
+        # имя автора выводится в карточке: его правка обновляет карточки
+        self.authorized_client.get(reverse('posts:index'))
+        author = User.objects.get(pk=post.author_id)
+        author.first_name, author.last_name = 'Новое', 'Имя'
+        author.save()
+        for address in (reverse_name, reverse('posts:index')):
+            self.assertContains(self.authorized_client.get(address),
+                                'Новое Имя')
+
+        # регистрация и смена пароля карточки не сбрасывают
+        version = cards_version()
+        user = User.objects.create_user(username='newcomer')
+        user.set_password('secret')
+        user.save()
+        author.save()
+        self.assertEqual(cards_version(), version)
+
     def test_custom_template_error(self):
         response = self.guest_client.post('/')
         self.assertTemplateUsed(response, 'core/403csrf.html')
@@ -305,3 +730,66 @@ class PostPageTest(TestCase):
         response = self.guest_client.get('/404/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Коты спят. Кот спит на котах.')
+        cls.dogs = Post.objects.create(
+            author=cls.user, text='Собаки гуляют, а кошки спят')
+        cls.weather = Post.objects.create(
+            author=cls.user, text='Хорошая погода для прогулки')
+        # индекс строит воркер очереди
+        run_pending()
+
+    def search(self, query, **params):
+        return self.client.get(reverse('posts:search'),
+                               {'q': query, **params})
+
+    def test_search_stemming_and_ranking(self):
+        """ Поиск учитывает словоформы и ранжирует результаты
+        """
+        response = self.search('котов')
+        self.assertEqual(list(response.context['page_obj']), [self.cats])
+
+        response = self.search('коты спят')
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.cats, self.dogs])
+
+        response = self.search('погоды')
+        self.assertEqual(list(response.context['page_obj']), [self.weather])
+        self.assertEqual(len(self.search('и').context['page_obj']), 0)
+
+    def test_search_index_follows_changes(self):
+        """ Индекс обновляется при изменении и удалении поста
+        """
+        post = Post.objects.get(pk=self.weather.pk)
+        post.text = 'Дождливая погода'
+        post.save()
+        self.assertEqual(len(self.search('дождливый').context['page_obj']),
+                         0)
+        run_pending()
+        self.assertEqual(len(self.search('прогулка').context['page_obj']), 0)
+        self.assertEqual(len(self.search('дождь').context['page_obj']), 0)
+        self.assertEqual(len(self.search('дождливый').context['page_obj']),
+                         1)
+        post.delete()
+        self.assertEqual(len(self.search('погода').context['page_obj']), 0)
+
+    def test_search_paginator(self):
+        """ Выдача разбита на страницы, ссылки сохраняют запрос
+        """
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'кот номер {i}')
+            for i in range(settings.OUTPUT_LIMIT))
+        search.rebuild()
+        response = self.search('кот')
+        self.assertEqual(len(response.context['page_obj']),
+                         settings.OUTPUT_LIMIT)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82&amp;page=2')
+        response = self.search('кот', page=2)
+        self.assertEqual(len(response.context['page_obj']), 1)
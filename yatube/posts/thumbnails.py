@@ -0,0 +1,29 @@
+"""Подготовка миниатюр постов.
+
+Шаблоны не вызывают sorl-thumbnail: они берут готовый адрес из
+Post.thumbnail, а пока миниатюры нет, показывают заглушку. Миниатюры
+делает воркер очереди (posts.tasks.generate_thumbnail).
+"""
+from django.conf import settings
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from .cache import bump_feed_generation
+from .models import Post
+
+
+def generate(post_id):
+    """Делает миниатюру и сохраняет ее адрес в Post.thumbnail."""
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return None
+    thumbnail = get_thumbnail(post.image,
+                              settings.POST_THUMBNAIL_GEOMETRY,
+                              **settings.POST_THUMBNAIL_OPTIONS)
+    # картинку могли заменить, пока делалась миниатюра;
+    # updated_at меняется, чтобы устарела кешированная карточка поста
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnail=thumbnail.url, updated_at=timezone.now())
+    if updated:
+        bump_feed_generation()
+    return thumbnail.url
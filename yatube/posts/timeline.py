@@ -0,0 +1,241 @@
+"""Ленты подписок, материализованные при записи (fan-out on write).
+
+Пост автора при публикации раскладывается в TimelineEntry всех его
+подписчиков, поэтому follow_index читает одну индексированную таблицу
+вместо фильтра по тысячам авторов. Для популярных авторов (больше
+TIMELINE_FANOUT_LIMIT подписчиков) раскладка не делается: их посты
+подтягиваются в ленту при чтении (гибридная схема).
+
+Решение «раскладывать или подтягивать» хранится в
+AuthorStats.timeline_pull и одинаково для записи и чтения. Флаг
+ставится, когда подписчиков становится больше предела, а снимается
+задачей resume_fan_out, которая сначала раскладывает по лентам
+последние посты автора: иначе посты, написанные за время популярности,
+пропали бы из лент.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .utils import CursorPage
+
+BATCH_SIZE = 500
+# запас на посты, которые сохранялись, пока снимался флаг
+RESUME_OVERLAP = timedelta(minutes=1)
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+
+
+def is_pulled(author_id):
+    return AuthorStats.objects.filter(
+        user_id=author_id, timeline_pull=True).exists()
+
+
+def popular_authors_for(user):
+    """Авторы из подписок user, чьи посты не раскладываются по лентам."""
+    return AuthorStats.objects.filter(
+        timeline_pull=True,
+        user__following__user=user,
+    ).values_list('user_id', flat=True)
+
+
+def mark_pulled(author_id):
+    """Переводит автора, переросшего предел, на подтягивание при
+    чтении; возвращает, подтягиваются ли его посты."""
+    stats = AuthorStats.objects.filter(user_id=author_id)
+    state = stats.values_list('follower_count', 'timeline_pull').first()
+    if state is None:
+        return False
+    follower_count, pulled = state
+    if not pulled and follower_count > fanout_limit():
+        stats.update(timeline_pull=True)
+        return True
+    return pulled
+
+
+def should_resume(author_id):
+    """Подтягиваемый автор снова не больше предела."""
+    return AuthorStats.objects.filter(
+        user_id=author_id, timeline_pull=True,
+        follower_count__lte=fanout_limit()).exists()
+
+
+def _bulk_create(entries):
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def _fan_out(author_id, posts):
+    """Раскладывает посты [(id, pub_date)] всем подписчикам автора."""
+    if not posts:
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    entries = []
+    for user_id in followers.iterator():
+        entries += [TimelineEntry(user_id=user_id,
+                                  post_id=post_id,
+                                  author_id=author_id,
+                                  pub_date=pub_date)
+                    for post_id, pub_date in posts]
+        if len(entries) >= BATCH_SIZE:
+            _bulk_create(entries)
+            entries = []
+    if entries:
+        _bulk_create(entries)
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if not is_pulled(post.author_id):
+        _fan_out(post.author_id, [(post.id, post.pub_date)])
+
+
+def resume_fan_out(author_id):
+    """Возвращает раскладку автору, у которого подписчиков снова не
+    больше предела: его последние посты раскладываются по лентам, и
+    только после этого флаг снимается. Посты, опубликованные, пока
+    флаг снимался, раскладываются вторым проходом.
+    """
+    stats = AuthorStats.objects.filter(
+        user_id=author_id, timeline_pull=True,
+        follower_count__lte=fanout_limit())
+    if not stats.exists():
+        return
+    limit = getattr(settings, 'TIMELINE_BACKFILL', 200)
+    recent = (Post.objects.filter(author_id=author_id)
+              .order_by('-pub_date', '-id')
+              .values_list('id', 'pub_date'))
+    started = timezone.now()
+    _fan_out(author_id, list(recent[:limit]))
+    stats.update(timeline_pull=False)
+    _fan_out(author_id, list(
+        recent.filter(pub_date__gte=started - RESUME_OVERLAP)[:limit]))
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту последними постами автора после подписки."""
+    if mark_pulled(author_id):
+        return
+    limit = getattr(settings, 'TIMELINE_BACKFILL', 200)
+    posts = (Post.objects.filter(author_id=author_id)
+             .order_by('-pub_date', '-id')
+             .values_list('id', 'pub_date')[:limit])
+    _bulk_create([TimelineEntry(user_id=user_id,
+                                post_id=post_id,
+                                author_id=author_id,
+                                pub_date=pub_date)
+                  for post_id, pub_date in posts])
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def timeline_posts(user):
+    """Посты ленты подписок одним запросом: материализованная часть
+    плюс посты подтягиваемых авторов. Годится для старых ссылок
+    ?page=N; страницы по курсору читает TimelinePage.
+    """
+    condition = Q(id__in=TimelineEntry.objects.filter(
+        user=user).values('post'))
+    pulled = list(popular_authors_for(user))
+    if pulled:
+        condition |= Q(author__in=pulled)
+    return Post.objects.for_feed().filter(condition)
+
+
+class TimelinePage(CursorPage):
+    """Страница ленты подписок по курсору.
+
+    Ключи (pub_date, id) постов страницы берутся из TimelineEntry
+    пользователя по индексу (user, -pub_date, -post) и из постов каждого
+    подтягиваемого автора по индексу (author, -pub_date, -id) — с одной
+    границей курсора и LIMIT per_page + 1 у каждого запроса. Ключи
+    сливаются, повторы (пост автора, ставшего популярным, уже лежит в
+    ленте) убираются, а посты страницы выбираются по id.
+    """
+
+    def __init__(self, user, per_page, cursor=None, posts=None):
+        if posts is None:
+            posts = Post.objects.for_feed()
+        super().__init__(posts, per_page, cursor)
+        self.user = user
+
+    def key_querysets(self):
+        querysets = [self.keyset(
+            TimelineEntry.objects.filter(user=self.user),
+            ('pub_date', 'post_id')).values_list('pub_date', 'post_id')]
+        for author_id in popular_authors_for(self.user):
+            querysets.append(self.keyset(
+                Post.objects.filter(author_id=author_id),
+                ('pub_date', 'id')).values_list('pub_date', 'id'))
+        return querysets
+
+    def posts_queryset(self, ids):
+        # порядок восстанавливается по ключам, сортировка в базе не нужна
+        return self.queryset.filter(id__in=ids).order_by()
+
+    def _fetch(self):
+        if self._objects is not None:
+            return self._objects
+        backwards = self._position is not None and (
+            self._position[0] == 'prev')
+        keys = set()
+        for queryset in self.key_querysets():
+            keys.update(queryset)
+        keys = sorted(keys, reverse=not backwards)
+        self._has_more = len(keys) > self.per_page
+        ids = [post_id for _, post_id in keys[:self.per_page]]
+        rows = {}
+        for row in self.posts_queryset(ids):
+            rows[row['id'] if isinstance(row, dict) else row.id] = row
+        objects = [rows[post_id] for post_id in ids if post_id in rows]
+        if backwards:
+            objects.reverse()
+        self._objects = objects
+        return objects
+
+
+@transaction.atomic
+def rebuild():
+    """Собирает все ленты заново по таблице подписок.
+    Последние посты каждого автора читаются один раз и раскладываются
+    сразу всем его подписчикам.
+    """
+    TimelineEntry.objects.all().delete()
+    limit = getattr(settings, 'TIMELINE_BACKFILL', 200)
+    AuthorStats.objects.filter(
+        follower_count__gt=fanout_limit()).update(timeline_pull=True)
+    AuthorStats.objects.filter(
+        follower_count__lte=fanout_limit()).update(timeline_pull=False)
+    popular = set(AuthorStats.objects.filter(
+        timeline_pull=True).values_list('user_id', flat=True))
+    follows = (Follow.objects.order_by('author_id')
+               .values_list('author_id', 'user_id'))
+    entries = []
+    author_id, posts = None, []
+    for follow_author_id, user_id in follows.iterator():
+        if follow_author_id in popular:
+            continue
+        if follow_author_id != author_id:
+            author_id = follow_author_id
+            posts = list(Post.objects.filter(author_id=author_id)
+                         .order_by('-pub_date', '-id')
+                         .values_list('id', 'pub_date')[:limit])
+        entries += [TimelineEntry(user_id=user_id,
+                                  post_id=post_id,
+                                  author_id=author_id,
+                                  pub_date=pub_date)
+                    for post_id, pub_date in posts]
+        if len(entries) >= BATCH_SIZE:
+            _bulk_create(entries)
+            entries = []
+    _bulk_create(entries)
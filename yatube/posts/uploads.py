@@ -0,0 +1,115 @@
+"""Прием картинок постов.
+
+LimitedUploadHandler стоит первым в FILE_UPLOAD_HANDLERS и считает байты
+каждого загружаемого файла. Файл больше POST_IMAGE_MAX_UPLOAD_SIZE
+дальше не буферизуется — ни в память, ни во временный файл: вместо него
+форма получает пустой RejectedUpload и показывает ошибку. Если размер
+запроса из Content-Length заведомо больше предела, файл отклоняется сразу,
+без чтения первого куска.
+
+Форма (posts.forms.PostImageField) проверяет формат и размеры по
+заголовку картинки, не декодируя пиксели, а normalize перед сохранением
+поворачивает картинку по EXIF, убирает метаданные и уменьшает слишком
+большие оригиналы до POST_IMAGE_MAX_SIDE.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps
+
+# форматы, которые принимаются, и параметры их повторного сохранения
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'GIF': {},
+    'WEBP': {'quality': 90},
+}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+
+class RejectedUpload(UploadedFile):
+    """Файл, отброшенный из-за размера: содержимого нет, size — сколько
+    байт успело прийти."""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(io.BytesIO(), name, content_type, size)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.POST_IMAGE_MAX_UPLOAD_SIZE
+        self.request_too_large = False
+
+    def handle_raw_input(self, input_data, meta, content_length, boundary,
+                         encoding=None):
+        # кроме файла в запросе только поля формы, а они ограничены
+        # DATA_UPLOAD_MAX_MEMORY_SIZE
+        limit = self.max_size + (settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0)
+        self.request_too_large = (content_length or 0) > limit
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.rejected = self.request_too_large
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.rejected = True
+        # отклоненный файл не доходит до следующих обработчиков
+        return None if self.rejected else raw_data
+
+    def file_complete(self, file_size):
+        if not self.rejected:
+            return None
+        return RejectedUpload(self.file_name, self.content_type,
+                              self.received)
+
+
+def read_header(file):
+    """(формат, ширина, высота) по заголовку, без декодирования."""
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            return image.format, image.width, image.height
+    finally:
+        file.seek(0)
+
+
+def normalize(upload):
+    """Картинка без EXIF и не больше POST_IMAGE_MAX_SIDE по большей
+    стороне. Анимированные GIF не пересохраняются, чтобы не потерять
+    кадры."""
+    upload.seek(0)
+    with Image.open(upload) as image:
+        fmt = image.format
+        if getattr(image, 'is_animated', False):
+            upload.seek(0)
+            return upload
+        max_side = settings.POST_IMAGE_MAX_SIDE
+        if fmt == 'JPEG' and max(image.size) > max_side:
+            # JPEG умеет декодироваться сразу в уменьшенном масштабе
+            image.draft(image.mode, (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if fmt == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+        options = dict(SAVE_OPTIONS[fmt])
+        # save без exif= метаданные не переносит; цветовой профиль
+        # оставляем, иначе поплывут цвета
+        if image.info.get('icc_profile'):
+            options['icc_profile'] = image.info['icc_profile']
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, **options)
+    size = buffer.tell()
+    buffer.seek(0)
+    root, _ = os.path.splitext(os.path.basename(upload.name))
+    return InMemoryUploadedFile(
+        buffer, 'image', root + EXTENSIONS[fmt], Image.MIME[fmt],
+        size, None)
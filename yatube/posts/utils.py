@@ -1,8 +1,181 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db.models import Q
 
+FEED_ORDERING = ('pub_date', 'id')
+# целые в SQLite — 64-битные со знаком: большее число в курсоре
+# значит испорченный токен, а не OverflowError в запросе
+MAX_INTEGER = 2 ** 63 - 1
 
-def paginator(post_list, request):
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и ключ позиции в непрозрачный токен."""
+    raw = json.dumps([direction, *[str(value) for value in values]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, model, fields):
+    """Распаковывает токен курсора.
+    Возвращает (direction, values) или None, если токен испорчен.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, *raw_values = json.loads(
+            base64.urlsafe_b64decode(padded.encode()).decode())
+        if direction not in ('next', 'prev') or len(raw_values) != len(fields):
+            return None
+        values = [model._meta.get_field(field).to_python(value)
+                  for field, value in zip(fields, raw_values)]
+    except (binascii.Error, ValueError, TypeError, ValidationError):
+        return None
+    if any(value is None for value in values):
+        return None
+    if any(isinstance(value, int) and abs(value) > MAX_INTEGER
+           for value in values):
+        return None
+    return direction, values
+
+
+def keyset_filter(fields, values, lookup):
+    """Условие «строго после позиции» для составного ключа сортировки:
+    a <= va AND ((a < va) OR (a = va AND b < vb) OR ...)
+    Избыточное a <= va дает базе диапазон по индексу: без него SQLite
+    читает индекс с начала и отбрасывает строки до курсора.
+    """
+    condition = Q()
+    for i, field in enumerate(fields):
+        step = Q(**{f'{field}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            step &= Q(**{prev_field: prev_value})
+        condition |= step
+    return Q(**{f'{fields[0]}__{lookup}e': values[0]}) & condition
+
+
+class CursorPage(Sequence):
+    """Страница ленты, выбранная по курсору (keyset-пагинация).
+
+    Вместо COUNT(*) и OFFSET делается один запрос с LIMIT per_page + 1
+    от позиции курсора, поэтому время выборки не зависит от глубины
+    страницы. Записи упорядочены по убыванию полей fields.
+    Запрос выполняется лениво, при первом обращении к странице.
+    """
+    is_cursor = True
+
+    def __init__(self, queryset, per_page, cursor=None,
+                 fields=FEED_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = fields
+        self.cursor = cursor
+        self._position = None
+        if cursor:
+            self._position = decode_cursor(cursor, queryset.model, fields)
+        self._objects = None
+        self._has_more = False
+
+    def keyset(self, queryset, fields):
+        """queryset от позиции курсора в порядке страницы, LIMIT
+        per_page + 1; fields — поля того же ключа в этом queryset."""
+        if self._position is None:
+            queryset = queryset.order_by(*[f'-{f}' for f in fields])
+        else:
+            direction, values = self._position
+            lookup = 'lt' if direction == 'next' else 'gt'
+            queryset = queryset.filter(keyset_filter(fields, values, lookup))
+            if direction == 'next':
+                queryset = queryset.order_by(*[f'-{f}' for f in fields])
+            else:
+                queryset = queryset.order_by(*fields)
+        return queryset[:self.per_page + 1]
+
+    @property
+    def page_queryset(self):
+        """Запрос страницы с LIMIT; по нему же проверяется план запроса."""
+        return self.keyset(self.queryset, self.fields)
+
+    def _fetch(self):
+        if self._objects is not None:
+            return self._objects
+        objects = list(self.page_queryset)
+        self._has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if self._position is not None and self._position[0] == 'prev':
+            objects.reverse()
+        self._objects = objects
+        return objects
+
+    @property
+    def object_list(self):
+        return self._fetch()
+
+    def __getitem__(self, index):
+        return self._fetch()[index]
+
+    def __len__(self):
+        return len(self._fetch())
+
+    def __repr__(self):
+        return f'<CursorPage {self.cursor or "first"}>'
+
+    def has_next(self):
+        # на пустой странице (посты после курсора удалили) не от чего
+        # строить ссылки
+        if not self._fetch():
+            return False
+        if self._position is not None and self._position[0] == 'prev':
+            return True
+        return self._has_more
+
+    def has_previous(self):
+        if not self._fetch():
+            return False
+        if self._position is None:
+            return False
+        if self._position[0] == 'next':
+            return True
+        return self._has_more
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _cursor_for(self, direction, obj):
+        # страница может состоять из объектов или словарей values()
+        if isinstance(obj, dict):
+            values = [obj[field] for field in self.fields]
+        else:
+            values = [getattr(obj, field) for field in self.fields]
+        return encode_cursor(direction, values)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self._cursor_for('next', self._fetch()[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self._cursor_for('prev', self._fetch()[0])
+
+
+def page_paginator(post_list, request):
     paginator = Paginator(post_list, settings.OUTPUT_LIMIT)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
+
+
+def paginator(post_list, request):
+    # Старые ссылки вида ?page=N продолжают работать через Paginator,
+    # все новые ссылки ленты строятся на курсорах.
+    if 'page' in request.GET:
+        return page_paginator(post_list, request)
+    return CursorPage(post_list,
+                      settings.OUTPUT_LIMIT,
+                      request.GET.get('cursor'))
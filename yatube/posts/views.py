@@ -1,13 +1,24 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import tasks
+from .conditions import (conditional_page, group_etag, groups_etag,
+                         post_detail_etag, post_state, profile_etag)
+from .counters import get_stats
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
-from .utils import paginator
+from .groups import get_group, registry
+from .models import Comment, Follow, Post, User
+from .search import search_posts
+from .timeline import TimelinePage, timeline_posts
+from .utils import CursorPage, page_paginator, paginator
 
 
 def index(request):
-    post_list = Post.objects.select_related().all()
+    post_list = Post.objects.for_feed()
     page_obj = paginator(post_list, request)
     context = {
         'page_obj': page_obj,
@@ -15,9 +26,10 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(group_etag)
 def group(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.post.all()
+    group = get_group(slug)
+    posts = Post.objects.for_feed().filter(group_id=group.id)
     page_obj = paginator(posts, request)
     context = {
         'group': group,
@@ -25,9 +37,17 @@ def group(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(groups_etag)
+def group_index(request):
+    return render(request, 'posts/group_index.html',
+                  {'groups': registry().groups})
+
+
+@conditional_page(profile_etag)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    page_obj = paginator(author.post.all(), request)
+    page_obj = paginator(Post.objects.for_feed().filter(author=author),
+                         request)
     if request.user.is_authenticated:
         user = request.user
         following = Follow.objects.filter(user=user, author=author).exists()
@@ -36,25 +56,61 @@ def profile(request, username):
     context = {
         'page_obj': page_obj,
         'author': author,
+        'stats': get_stats(author),
         'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(post_detail_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    count = Post.objects.filter(author=post.author).count()
-    comments = Comment.objects.filter(post=post_id)
+    post = get_object_or_404(Post.objects.for_detail(), id=post_id)
+    count = get_stats(post.author).post_count
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
         'count': count,
-        'comments': comments,
+        'comments': comments_page(post.id),
         'form': form
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_page(post_id, cursor=None):
+    """Порция комментариев поста, новые сначала. Курсор по
+    (created, id) идет по индексу comment_post_created_idx.
+    """
+    return CursorPage(Comment.objects.for_post(post_id),
+                      settings.COMMENTS_PER_PAGE, cursor,
+                      fields=('created', 'id'))
+
+
+@conditional_page(post_detail_etag)
+def post_comments(request, post_id):
+    """HTML-фрагмент со следующей порцией комментариев для
+    кнопки «Показать еще» на странице поста."""
+    # состояние поста уже выбрано для ETag; None — поста нет
+    if post_state(request, post_id) is None:
+        raise Http404('Пост не найден')
+    context = {
+        'post_id': post_id,
+        'comments': comments_page(post_id, request.GET.get('cursor')),
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search_posts(query) if query else Post.objects.none()
+    page_obj = page_paginator(posts, request)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'extra_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
@@ -63,6 +119,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        tasks.queue_images(post)
         return redirect('posts:profile', request.user.username)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -77,7 +134,11 @@ def post_edit(request, post_id):
                     instance=post,
                     )
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        if 'image' in form.changed_data:
+            post.thumbnail = ''
+        post.save()
+        tasks.queue_images(post)
         return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -102,10 +163,11 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     # информация о текущем пользователе доступна в переменной request.user
-    user = request.user
-    authors = user.follower.values_list('author', flat=True)
-    posts_list = Post.objects.filter(author__id__in=authors)
-    page_obj = paginator(posts_list, request)
+    if 'page' in request.GET:
+        page_obj = page_paginator(timeline_posts(request.user), request)
+    else:
+        page_obj = TimelinePage(request.user, settings.OUTPUT_LIMIT,
+                                request.GET.get('cursor'))
     context = {'page_obj': page_obj,
                'follow': True, }
     return render(request, 'posts/follow.html', context)
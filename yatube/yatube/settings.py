@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -51,6 +52,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.static.StaticFilesMiddleware',
+    'core.middleware.PerformanceMiddleware',
+    'core.db.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,7 +70,7 @@ DIR_TEMPLATES = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.InstrumentedDjangoTemplates',
         'DIRS': [DIR_TEMPLATES, ],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -87,11 +91,45 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Постоянные соединения: CONN_MAX_AGE секунд соединение переиспользуется
+# между запросами одного потока.
+CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'OPTIONS': {'timeout': 20},
+    }
+}
+
+# Реплики для чтения (core.db): пути к файлам SQLite через запятую
+# в DATABASE_REPLICA_PATHS. Локально их обновляет команда sync_replicas.
+# В тестах реплики смотрят в тестовую основную базу.
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get(
+        'DATABASE_REPLICA_PATHS', '').split(',')), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': path.strip(),
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.db.PrimaryReplicaRouter']
+REPLICA_APPS = ('posts',)
+REPLICA_PIN_SECONDS = 5
+
+# Прагмы SQLite для каждого нового соединения: WAL позволяет читать
+# во время записи, synchronous = NORMAL безопасен вместе с WAL.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,
+    'mmap_size': 134217728,
 }
 
 
@@ -135,7 +173,16 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# collectstatic собирает статику в STATIC_ROOT: имена с хешем
+# содержимого и сжатые копии .gz/.br (core.static). Оттуда ее отдает
+# core.static.StaticFilesMiddleware с кешированием на год.
+STATIC_ROOT = os.environ.get('STATIC_ROOT',
+                             os.path.join(BASE_DIR, 'staticfiles'))
+STATICFILES_STORAGE = 'core.static.CompressedManifestStaticFilesStorage'
+
 OUTPUT_LIMIT = 10
+# Комментариев на странице поста и в каждой следующей порции.
+COMMENTS_PER_PAGE = 20
 TEXT_LIMIT = 15
 
 LOGIN_URL = 'users:login'
@@ -152,9 +199,124 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Загрузки (posts.uploads): файл больше POST_IMAGE_MAX_UPLOAD_SIZE
+# отбрасывается, не дойдя до памяти или временного файла.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+# Размеры проверяются по заголовку до декодирования: защита от картинок
+# с огромным числом пикселей в маленьком файле.
+POST_IMAGE_MAX_PIXELS = 40 * 10**6
+# Оригиналы больше этого по большей стороне уменьшаются при загрузке.
+POST_IMAGE_MAX_SIDE = 2560
+# manage.py collect_media не трогает файлы моложе этого (секунды):
+# ссылку на только что сохраненный файл может еще не успеть записать
+# пост или воркер очереди.
+MEDIA_GC_GRACE = 60 * 60 * 24
+
+
+# Общий кеш для всех воркеров: сервер с протоколом Redis из REDIS_URL
+# (core.cache.RespCache). Пока сервер недоступен, кеш работает через
+# файлы в CACHE_FALLBACK_DIR. Без REDIS_URL (разработка, тесты) кеш
+# живет в памяти процесса.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+CACHE_FALLBACK_DIR = os.environ.get(
+    'CACHE_FALLBACK_DIR', os.path.join(BASE_DIR, 'cache'))
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.InstrumentedRespCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'SOCKET_TIMEOUT': 0.5,
+                'FALLBACK_LOCATION': CACHE_FALLBACK_DIR,
+                'RETRY_SECONDS': 5,
+            },
+        }
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.InstrumentedLocMemCache',
+        }
+    }
+
+# Фрагменты лент живут долго: их сбрасывает счетчик поколений
+# (posts.cache) при любом изменении Post или Group.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# Сколько секунд один воркер может пересчитывать фрагмент ленты, пока
+# остальные ждут его или отдают старую версию (core.cache.get_or_compute).
+FEED_CACHE_LOCK_TIMEOUT = 10
+
+# Карточки постов (posts.templatetags.post_cards) кешируются по одной:
+# ключ содержит updated_at поста, поэтому правка меняет только свою
+# карточку, а старые ключи просто истекают.
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# Справочник групп (posts.groups) хранится под ключом с версией, поэтому
+# срок нужен только для того, чтобы старые версии не копились.
+GROUP_REGISTRY_TIMEOUT = 60 * 60 * 24
+# Сколько групп показывать в списке популярных.
+POPULAR_GROUPS_LIMIT = 5
+
+# Ленты подписок (posts.timeline): авторы с большим числом подписчиков
+# не раскладываются по лентам при записи, а подтягиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL = 200
+
+# Миниатюры постов (posts.thumbnails) готовятся в фоне после сохранения.
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# Копии картинки для srcset (posts.images): ширины в пикселях и
+# атрибут sizes — какую ширину картинка занимает на странице.
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_SIZES = '(min-width: 1200px) 860px, (min-width: 768px) 75vw, 100vw'
+
+# Очередь фоновых задач (core.tasks), воркер — manage.py run_tasks.
+# При TASKS_EAGER задачи выполняются сразу, в том же запросе.
+TASKS_EAGER = os.environ.get('TASKS_EAGER', '') == '1'
+TASK_MAX_ATTEMPTS = 3
+# задержка перед повтором, секунды; удваивается с каждой попыткой
+TASK_RETRY_DELAY = 10
+# задачу пропавшего воркера можно взять снова через столько секунд
+TASK_LOCK_TIMEOUT = 600
+TASK_POLL_INTERVAL = 1
+
+# Журнал изменений постов и комментариев (posts.changes):
+# сколько записей отдается за одно чтение.
+CHANGES_LIMIT = 500
+
+# Метрики запросов (core.middleware.PerformanceMiddleware): заголовок
+# Server-Timing и журнал медленных запросов в формате JSON.
+SERVER_TIMING = True
+SLOW_REQUEST_THRESHOLD_MS = 500
+SLOW_REQUEST_LOG = os.path.join(BASE_DIR, 'slow_requests.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_REQUEST_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }